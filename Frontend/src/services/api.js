@@ -9,6 +9,11 @@ const api = axios.create({
   },
 });
 
+// Marker of this client's last write. Sending it back keeps the next reads on the
+// primary database, so they see the change (cookies don't cross origins here).
+const LAST_WRITE_HEADER = 'X-Last-Write';
+let lastWrite = null;
+
 // Add token to requests if available
 api.interceptors.request.use(
   (config) => {
@@ -16,6 +21,9 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    if (lastWrite) {
+      config.headers[LAST_WRITE_HEADER] = lastWrite;
+    }
     return config;
   },
   (error) => {
@@ -23,6 +31,14 @@ api.interceptors.request.use(
   }
 );
 
+api.interceptors.response.use((response) => {
+  const written = response.headers[LAST_WRITE_HEADER.toLowerCase()];
+  if (written) {
+    lastWrite = written;
+  }
+  return response;
+});
+
 export const authAPI = {
   login: async (username, password, userType) => {
     const response = await api.post('/auth/login', {
@@ -0,0 +1,529 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import ATTENDANCE, ATTENDANCE_SESSION_ROLLUP, ATTENDANCE_STUDENT_ROLLUP, SCHEDULE, STUDENT
+from database import SessionLocal
+from auth import SECRET_KEY
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import base64
+import hashlib
+import hmac
+import os
+import queue
+import threading
+import time
+
+# Write-behind tuning
+ATTENDANCE_FLUSH_BATCH = int(os.getenv("ATTENDANCE_FLUSH_BATCH", "500"))
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", "0.5"))  # seconds
+# Largest offline sync batch accepted in one request, and IN-list chunk size for bulk lookups
+ATTENDANCE_SYNC_MAX_RECORDS = int(os.getenv("ATTENDANCE_SYNC_MAX_RECORDS", "10000"))
+BULK_LOOKUP_CHUNK = 500
+# How long the in-memory schedule/student indexes are trusted before reloading
+ATTENDANCE_INDEX_TTL = float(os.getenv("ATTENDANCE_INDEX_TTL", "60"))
+
+QR_PAYLOAD_VERSION = "v1"
+
+# Statuses that count as attending a session in the rollups
+PRESENT_STATUSES = ("Present", "Late")
+
+def _qr_signature(body: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode("ascii").rstrip("=")
+
+def sign_qr_payload(schedule_id: str, session_date: date, expires_at: int) -> str:
+    """Build the signed payload encoded in a classroom QR code"""
+    body = f"{QR_PAYLOAD_VERSION}.{schedule_id}.{session_date.strftime('%Y%m%d')}.{int(expires_at)}"
+    return f"{body}.{_qr_signature(body)}"
+
+def verify_qr_payload(payload: str, now: Optional[float] = None) -> Dict:
+    """Check signature and expiry of a QR payload; raises ValueError if it is not usable"""
+    try:
+        version, rest = payload.split(".", 1)
+        schedule_id, session_str, expires_str, signature = rest.rsplit(".", 3)
+        expires_at = int(expires_str)
+        session_date = datetime.strptime(session_str, "%Y%m%d").date()
+    except (AttributeError, ValueError):
+        raise ValueError("Malformed QR payload")
+
+    if version != QR_PAYLOAD_VERSION:
+        raise ValueError("Unsupported QR payload version")
+
+    body = payload[:-(len(signature) + 1)]
+    if not hmac.compare_digest(signature, _qr_signature(body)):
+        raise ValueError("Invalid QR signature")
+
+    if (now if now is not None else time.time()) > expires_at:
+        raise ValueError("QR code has expired")
+
+    return {"schedule_id": schedule_id, "session_date": session_date, "expires_at": expires_at}
+
+def attendance_hash(student_id: str, schedule_id: str, session_date: date) -> str:
+    """Value stored in ATTENDANCE.qr_code_hash: one row per student per class session"""
+    key = f"{student_id}|{schedule_id}|{session_date.isoformat()}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class ScheduleSlotIndex:
+    """
+    In-memory view of SCHEDULE slots and student sections for check-in validation.
+
+    SCHEDULE is small (sections x periods) so it is loaded whole; students are
+    loaded one at a time on first scan. Both are reloaded after ATTENDANCE_INDEX_TTL
+    seconds, and a schedule miss forces an early reload so new entries are seen.
+    """
+
+    def __init__(self, ttl: float = ATTENDANCE_INDEX_TTL):
+        self.ttl = ttl
+        self._slots: Dict[str, Dict] = {}
+        self._student_sections: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload(self, db: Session):
+        rows = db.query(SCHEDULE.id, SCHEDULE.day_id, SCHEDULE.period_id, SCHEDULE.section, SCHEDULE.subcode).all()
+        self._slots = {
+            row.id: {"day_id": row.day_id, "period_id": row.period_id, "section": row.section, "subcode": row.subcode}
+            for row in rows
+        }
+        self._student_sections = {}
+        self._loaded_at = time.monotonic()
+
+    def get_slot(self, db: Session, schedule_id: str) -> Optional[Dict]:
+        with self._lock:
+            stale = time.monotonic() - self._loaded_at > self.ttl
+            if stale or schedule_id not in self._slots:
+                # Misses reload at most once per second to keep bad payloads cheap
+                if stale or time.monotonic() - self._loaded_at > 1.0:
+                    self._reload(db)
+            return self._slots.get(schedule_id)
+
+    def get_student_section(self, db: Session, student_id: str) -> Optional[str]:
+        with self._lock:
+            if student_id in self._student_sections:
+                return self._student_sections[student_id]
+        section = db.query(STUDENT.section).filter(STUDENT.id == student_id).scalar()
+        if section is not None:
+            with self._lock:
+                self._student_sections[student_id] = section
+        return section
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+ATTENDANCE_COLUMNS = [column.name for column in ATTENDANCE.__table__.columns if column.name != "id"]
+
+def insert_attendance_rows(db: Session, rows: List[Dict]) -> List[Dict]:
+    """
+    Insert attendance rows in one statement, skipping any whose qr_code_hash already exists.
+    Rows may carry extra keys, which are not written.
+    Returns the rows that were actually inserted. Does not commit.
+    """
+    if not rows:
+        return []
+
+    params = [{name: row[name] for name in ATTENDANCE_COLUMNS if name in row} for row in rows]
+    by_hash = {row["qr_code_hash"]: row for row in rows}
+
+    insert = _conflict_insert(db)
+    if insert is not None:
+        stmt = insert(ATTENDANCE.__table__).on_conflict_do_nothing(index_elements=["qr_code_hash"])
+        result = db.execute(stmt.returning(ATTENDANCE.__table__.c.qr_code_hash), params)
+        return [by_hash[qr_hash] for qr_hash in result.scalars().all()]
+
+    # Other backends: isolate each row in a savepoint so one duplicate doesn't abort the batch
+    inserted = []
+    for row, row_params in zip(rows, params):
+        try:
+            with db.begin_nested():
+                db.execute(ATTENDANCE.__table__.insert(), [row_params])
+            inserted.append(row)
+        except Exception:
+            pass
+    return inserted
+
+def _conflict_insert(db: Session):
+    """The dialect's INSERT construct supporting ON CONFLICT, or None if it has none"""
+    # Imported on use: the PostgreSQL dialect package is slow to import and unused on SQLite
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+def _upsert_counts(db: Session, table, key_columns: List[str], rows: List[Dict], extra_updates: List[str] = ()):
+    """Add each row's present_count onto the rollup row with the same key, creating it if needed"""
+    insert = _conflict_insert(db)
+    if insert is not None:
+        stmt = insert(table)
+        updates = {"present_count": table.c.present_count + stmt.excluded.present_count}
+        for column in extra_updates:
+            updates[column] = getattr(stmt.excluded, column)
+        db.execute(stmt.on_conflict_do_update(index_elements=key_columns, set_=updates), rows)
+        return
+
+    for row in rows:
+        key = [table.c[column] == row[column] for column in key_columns]
+        updated = db.execute(
+            table.update().where(*key).values(
+                present_count=table.c.present_count + row["present_count"],
+                **{column: row[column] for column in extra_updates}
+            )
+        )
+        if updated.rowcount == 0:
+            db.execute(table.insert(), [row])
+
+def update_rollups(db: Session, rows: List[Dict]):
+    """
+    Fold newly inserted attendance rows into the rollup tables. Does not commit.
+    Rows need student_id, schedule_id, timestamp and session_date.
+    """
+    if not rows:
+        return
+
+    schedule_ids = {row["schedule_id"] for row in rows}
+    slots = {
+        entry.id: (entry.section, entry.subcode)
+        for entry in db.query(SCHEDULE.id, SCHEDULE.section, SCHEDULE.subcode).filter(SCHEDULE.id.in_(schedule_ids)).all()
+    }
+
+    student_counts: Dict[tuple, Dict] = {}
+    session_counts: Dict[tuple, Dict] = {}
+    for row in rows:
+        if row["schedule_id"] not in slots:
+            continue
+        section, subcode = slots[row["schedule_id"]]
+
+        student_key = (row["student_id"], subcode)
+        student_row = student_counts.setdefault(student_key, {
+            "student_id": row["student_id"], "subcode": subcode, "present_count": 0, "last_seen": row["timestamp"]
+        })
+        student_row["present_count"] += 1
+        student_row["last_seen"] = max(student_row["last_seen"], row["timestamp"])
+
+        session_key = (section, row["schedule_id"], row["session_date"])
+        session_row = session_counts.setdefault(session_key, {
+            "section": section, "schedule_id": row["schedule_id"], "session_date": row["session_date"],
+            "subcode": subcode, "present_count": 0
+        })
+        session_row["present_count"] += 1
+
+    _upsert_counts(db, ATTENDANCE_STUDENT_ROLLUP.__table__, ["student_id", "subcode"],
+                   list(student_counts.values()), ["last_seen"])
+    _upsert_counts(db, ATTENDANCE_SESSION_ROLLUP.__table__, ["section", "schedule_id", "session_date"],
+                   list(session_counts.values()))
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recompute both rollup tables from ATTENDANCE (backfill or repair).
+    Session dates are the ones stored at check-in, so a rebuild matches the live
+    rollups; rows written before session_date existed fall back to the timestamp's
+    date. Commits; returns the number of rows folded in.
+    """
+    db.query(ATTENDANCE_STUDENT_ROLLUP).delete()
+    db.query(ATTENDANCE_SESSION_ROLLUP).delete()
+
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.query(ATTENDANCE.id, ATTENDANCE.student_id, ATTENDANCE.schedule_id, ATTENDANCE.timestamp,
+                         ATTENDANCE.session_date).filter(
+            ATTENDANCE.id > last_id,
+            ATTENDANCE.status.in_(PRESENT_STATUSES)
+        ).order_by(ATTENDANCE.id).limit(ATTENDANCE_FLUSH_BATCH).all()
+        if not batch:
+            break
+        update_rollups(db, [
+            {"student_id": row.student_id, "schedule_id": row.schedule_id, "timestamp": row.timestamp,
+             "session_date": row.session_date or row.timestamp.date()}
+            for row in batch
+        ])
+        total += len(batch)
+        last_id = batch[-1].id
+
+    db.commit()
+    return total
+
+class AttendanceWriteBuffer:
+    """
+    Write-behind queue for check-ins.
+
+    Requests enqueue rows and return immediately; a background thread drains the
+    queue every ATTENDANCE_FLUSH_INTERVAL seconds (or as soon as a full batch is
+    waiting) and writes each batch in a single transaction.
+    """
+
+    def __init__(self, batch_size: int = ATTENDANCE_FLUSH_BATCH, interval: float = ATTENDANCE_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Dict]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Hashes accepted by this process per session date, so repeat scans are
+        # rejected before they reach the DB (the unique index is the backstop)
+        self._seen: Dict[date, set] = {}
+        self._seen_lock = threading.Lock()
+        self.flushed = 0
+        self.dropped = 0
+
+    def submit(self, row: Dict, session_date: date) -> bool:
+        """Queue a row; returns False if its qr_code_hash was already accepted"""
+        with self._seen_lock:
+            seen = self._seen.get(session_date)
+            if seen is None:
+                # Only today's and yesterday's sessions can still be scanned
+                for old_date in [d for d in self._seen if (session_date - d).days > 1]:
+                    del self._seen[old_date]
+                seen = self._seen[session_date] = set()
+            if row["qr_code_hash"] in seen:
+                return False
+            seen.add(row["qr_code_hash"])
+        self._queue.put(row)
+        return True
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="attendance-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.interval)
+            while self.flush() >= self.batch_size:
+                pass
+
+    def _drain(self) -> List[Dict]:
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def flush(self) -> int:
+        """Write one batch; returns how many rows were taken off the queue"""
+        rows = self._drain()
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            self.write_batch(db, rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error flushing {len(rows)} attendance rows, retrying individually: {e}")
+            self._write_individually(db, rows)
+        finally:
+            db.close()
+
+        self.flushed += len(rows)
+        return len(rows)
+
+    def _write_individually(self, db: Session, rows: List[Dict]):
+        """Fallback after a failed batch: keep the good rows, drop the ones that can never be written"""
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    self.write_batch(db, [row])
+            except Exception as e:
+                self.dropped += 1
+                print(f"Dropping attendance row for {row['student_id']} / {row['schedule_id']}: {e}")
+        db.commit()
+
+    def write_batch(self, db: Session, rows: List[Dict]) -> List[Dict]:
+        inserted = insert_attendance_rows(db, rows)
+        update_rollups(db, inserted)
+        return inserted
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+slot_index = ScheduleSlotIndex()
+write_buffer = AttendanceWriteBuffer()
+
+def check_in(db: Session, student_id: str, payload: str, now: Optional[datetime] = None) -> Dict:
+    """
+    Validate a scanned QR payload for a student and queue the attendance row.
+    Raises ValueError for invalid scans and LookupError for duplicates.
+    """
+    now = now or datetime.now()
+    qr = verify_qr_payload(payload, now.timestamp())
+
+    slot = slot_index.get_slot(db, qr["schedule_id"])
+    if slot is None:
+        raise ValueError("Class not found in the current timetable")
+
+    # The QR must be for today's session of a class that meets today
+    if qr["session_date"] != now.date() or slot["day_id"] != now.isoweekday():
+        raise ValueError("This class is not in session today")
+
+    section = slot_index.get_student_section(db, student_id)
+    if section is None:
+        raise ValueError("Student not found")
+    if section != slot["section"]:
+        raise ValueError(f"Student is not enrolled in section {slot['section']}")
+
+    row = {
+        "student_id": student_id,
+        "schedule_id": qr["schedule_id"],
+        "timestamp": datetime.utcnow(),
+        "status": "Present",
+        "qr_code_hash": attendance_hash(student_id, qr["schedule_id"], qr["session_date"]),
+        "verification_method": "QR",
+        "created_at": datetime.utcnow(),
+        "session_date": qr["session_date"],
+    }
+    if not write_buffer.submit(row, qr["session_date"]):
+        raise LookupError("Attendance already recorded for this class")
+
+    return {
+        "status": "Present",
+        "schedule_id": qr["schedule_id"],
+        "subcode": slot["subcode"],
+        "section": slot["section"],
+        "session_date": qr["session_date"].isoformat()
+    }
+
+def _lookup_in_chunks(db: Session, columns, key_column, keys) -> Dict:
+    """Fetch rows for many keys with a few IN queries; returns {key: row}"""
+    keys = list(keys)
+    found = {}
+    for i in range(0, len(keys), BULK_LOOKUP_CHUNK):
+        for row in db.query(*columns).filter(key_column.in_(keys[i:i + BULK_LOOKUP_CHUNK])).all():
+            found[row[0]] = row
+    return found
+
+def _scan_time(timestamp: datetime) -> Tuple[datetime, date]:
+    """
+    Timestamp to store (naive UTC, as check_in writes it) and session date (the
+    local day, as on the QR code) of an offline scan. Naive times are local.
+    """
+    local = timestamp.astimezone() if timestamp.tzinfo else timestamp
+    return local.astimezone(timezone.utc).replace(tzinfo=None), local.date()
+
+def sync_records(db: Session, records: List[Dict]) -> List[Dict]:
+    """
+    Bulk-ingest attendance collected offline and return one outcome per record, in order.
+
+    Students and schedule entries are validated with set-based lookups, rows are
+    written with a single INSERT ... ON CONFLICT DO NOTHING, and rollups are updated
+    in the same transaction. Outcomes: inserted, duplicate, unknown_student,
+    unknown_schedule, wrong_section.
+    """
+    students = _lookup_in_chunks(db, [STUDENT.id, STUDENT.section], STUDENT.id, {r["student_id"] for r in records})
+    slots = _lookup_in_chunks(db, [SCHEDULE.id, SCHEDULE.section], SCHEDULE.id, {r["schedule_id"] for r in records})
+
+    outcomes = []
+    candidates = {}
+    for index, record in enumerate(records):
+        outcome = {"index": index, "student_id": record["student_id"], "schedule_id": record["schedule_id"]}
+        outcomes.append(outcome)
+
+        student = students.get(record["student_id"])
+        slot = slots.get(record["schedule_id"])
+        if student is None:
+            outcome["status"] = "unknown_student"
+            continue
+        if slot is None:
+            outcome["status"] = "unknown_schedule"
+            continue
+        if student.section != slot.section:
+            outcome["status"] = "wrong_section"
+            continue
+
+        timestamp, session_date = _scan_time(record["timestamp"])
+        qr_hash = attendance_hash(record["student_id"], record["schedule_id"], session_date)
+        outcome["qr_code_hash"] = qr_hash
+        if qr_hash in candidates:
+            # Same student scanned twice for one session within the upload
+            outcome["status"] = "duplicate"
+            continue
+
+        candidates[qr_hash] = {
+            "student_id": record["student_id"],
+            "schedule_id": record["schedule_id"],
+            "timestamp": timestamp,
+            "status": record.get("status") or "Present",
+            "qr_code_hash": qr_hash,
+            "verification_method": record.get("verification_method") or "QR",
+            "created_at": datetime.utcnow(),
+            "session_date": session_date,
+        }
+
+    inserted = insert_attendance_rows(db, list(candidates.values()))
+    update_rollups(db, [row for row in inserted if row["status"] in PRESENT_STATUSES])
+    db.commit()
+
+    inserted_hashes = {row["qr_code_hash"] for row in inserted}
+    for outcome in outcomes:
+        if "status" not in outcome:
+            outcome["status"] = "inserted" if outcome["qr_code_hash"] in inserted_hashes else "duplicate"
+
+    return outcomes
+
+def get_student_attendance(db: Session, student_id: str) -> Dict:
+    """
+    Per-subject attendance for a student, read from the rollups.
+    A session counts as held once anyone in the section has checked in to it.
+    """
+    section = db.query(STUDENT.section).filter(STUDENT.id == student_id).scalar()
+    if section is None:
+        raise LookupError(f"Student {student_id} not found")
+
+    held = dict(
+        db.query(ATTENDANCE_SESSION_ROLLUP.subcode, func.count())
+        .filter(ATTENDANCE_SESSION_ROLLUP.section == section)
+        .group_by(ATTENDANCE_SESSION_ROLLUP.subcode)
+        .all()
+    )
+    attended = {
+        row.subcode: row
+        for row in db.query(ATTENDANCE_STUDENT_ROLLUP).filter(ATTENDANCE_STUDENT_ROLLUP.student_id == student_id).all()
+    }
+
+    subjects = []
+    for subcode in sorted(set(held) | set(attended)):
+        sessions_held = held.get(subcode, 0)
+        present = attended[subcode].present_count if subcode in attended else 0
+        subjects.append({
+            "subcode": subcode,
+            "attended": present,
+            "held": sessions_held,
+            "percentage": round(100.0 * present / sessions_held, 1) if sessions_held else None,
+            "last_seen": attended[subcode].last_seen if subcode in attended else None
+        })
+
+    return {"student_id": student_id, "section": section, "subjects": subjects}
+
+def get_section_sessions(db: Session, section: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict]:
+    """Present counts for each class session of a section, read from the session rollup"""
+    query = db.query(ATTENDANCE_SESSION_ROLLUP).filter(ATTENDANCE_SESSION_ROLLUP.section == section)
+    if start is not None:
+        query = query.filter(ATTENDANCE_SESSION_ROLLUP.session_date >= start)
+    if end is not None:
+        query = query.filter(ATTENDANCE_SESSION_ROLLUP.session_date <= end)
+
+    return [
+        {
+            "schedule_id": row.schedule_id,
+            "session_date": row.session_date.isoformat(),
+            "subcode": row.subcode,
+            "present": row.present_count
+        }
+        for row in query.order_by(ATTENDANCE_SESSION_ROLLUP.session_date, ATTENDANCE_SESSION_ROLLUP.schedule_id).all()
+    ]
@@ -132,3 +132,21 @@ def get_current_admin(payload: dict = Depends(verify_token_and_get_payload)):
             detail="Not enough permissions"
         )
     return username
+
+def get_current_student(payload: dict = Depends(verify_token_and_get_payload)):
+    """Verify that the current user is a student and return their student id"""
+    if payload.get("user_type", "").lower() != "student":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only students can perform this action"
+        )
+    return payload.get("username")
+
+def get_current_staff(payload: dict = Depends(verify_token_and_get_payload)):
+    """Verify that the current user is faculty or an admin"""
+    if payload.get("user_type", "").lower() not in ("faculty", "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return payload.get("username")
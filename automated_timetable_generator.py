@@ -1,5 +1,9 @@
 from sqlalchemy.orm import Session
-from models import SUBJECTS, FACULTY, SCHEDULE
+from models import SCHEDULE
+from catalog import catalog
+from change_feed import entry_delta, record_change
+from schedule_history import log_changes
+from schedule_generator import ScheduleGenerator
 from typing import List, Dict, Tuple, Optional
 import uuid
 from datetime import datetime
@@ -51,13 +55,15 @@ class AutomatedTimetableGenerator:
     
     def _clear_all_schedules(self):
         """Clear all existing schedule entries"""
+        removed = [entry_delta(entry) for entry in self.db.query(SCHEDULE)]
         self.db.query(SCHEDULE).delete()
+        log_changes(self.db, [(row, None) for row in removed])
+        record_change(self.db, {"op": "clear", "section": None}, None, None)
         self.db.commit()
     
     def _clear_section_schedule(self, section: str):
         """Clear existing schedule entries for a specific section"""
-        self.db.query(SCHEDULE).filter(SCHEDULE.section == section).delete()
-        self.db.commit()
+        ScheduleGenerator(self.db).clear_section_schedule(section)
     
     def _generate_section_timetable(self, section: str, subject_faculty_map: Dict[str, str]) -> Dict:
         """Generate timetable for a single section"""
@@ -99,59 +105,23 @@ class AutomatedTimetableGenerator:
     def _validate_assignments(self, subject_faculty_map: Dict[str, str]) -> Dict:
         """Validate subject-faculty assignments"""
         
+        known = catalog.get(self.db, subjects=subject_faculty_map.keys(), faculty=subject_faculty_map.values())
         for subcode, fini in subject_faculty_map.items():
-            # Check if subject exists
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
-            if not subject:
+            # Check if subject exists and can be scheduled
+            if not known.subject(subcode):
                 return {"valid": False, "message": f"Subject {subcode} not found"}
+            if subcode in known.requirement_errors:
+                return {"valid": False, "message": known.requirement_errors[subcode]}
             
             # Check if faculty exists
-            faculty = self.db.query(FACULTY).filter(FACULTY.initials == fini).first()
-            if not faculty:
+            if not known.faculty(fini):
                 return {"valid": False, "message": f"Faculty {fini} not found"}
         
         return {"valid": True, "message": "All assignments valid"}
     
     def _get_subject_requirements(self, subject_codes: List[str]) -> Dict[str, Dict]:
         """Get requirements for each subject"""
-        requirements = {}
-        
-        for subcode in subject_codes:
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
-            if subject:
-                periods_needed = self._calculate_periods_needed(subject)
-                is_lab = subject.subtype.upper() in ['L', 'P']
-                
-                requirements[subcode] = {
-                    'name': subject.name,
-                    'credits': subject.credits,
-                    'subtype': subject.subtype,
-                    'periods_needed': periods_needed,
-                    'is_lab': is_lab,
-                    'consecutive_periods': self._get_consecutive_periods_needed(subject)
-                }
-        
-        return requirements
-    
-    def _calculate_periods_needed(self, subject) -> int:
-        """Calculate periods needed based on credits and type"""
-        if subject.subtype.upper() == 'T':
-            return int(subject.credits)
-        elif subject.subtype.upper() in ['L', 'P']:
-            return int(2 * subject.credits)
-        else:
-            return int(subject.credits)
-    
-    def _get_consecutive_periods_needed(self, subject) -> int:
-        """Get number of consecutive periods needed for lab subjects"""
-        if subject.subtype.upper() in ['L', 'P']:
-            if subject.credits == 1.5:
-                return 3  # 1.5 credits = 3 consecutive periods
-            elif subject.credits == 1.0:
-                return 2  # 1 credit = 2 consecutive periods
-            else:
-                return int(subject.credits)  # Default behavior
-        return 1  # Theory subjects don't need consecutive periods
+        return catalog.get(self.db).requirements_for(subject_codes)
     
     def _initialize_schedule_matrix(self) -> Dict:
         """Initialize empty schedule matrix"""
@@ -198,7 +168,7 @@ class AutomatedTimetableGenerator:
         if req['is_lab']:
             # Schedule lab periods consecutively
             consecutive_needed = req['consecutive_periods']
-            blocks_needed = periods_needed // consecutive_needed
+            blocks_needed = req['blocks']
             
             for block in range(blocks_needed):
                 if periods_scheduled >= periods_needed:
@@ -316,6 +286,7 @@ class AutomatedTimetableGenerator:
     def _save_schedule_to_db(self, section: str, schedule_matrix: Dict):
         """Save schedule matrix to database"""
         
+        saved = []
         for day in self.working_days:
             for period in range(1, self.periods_per_day + 1):
                 entry = schedule_matrix[day][period]
@@ -329,55 +300,47 @@ class AutomatedTimetableGenerator:
                         fini=entry['fini']
                     )
                     self.db.add(schedule_entry)
+                    saved.append(entry_delta(schedule_entry))
         
+        log_changes(self.db, [(None, row) for row in saved])
+        record_change(self.db, {"op": "replace", "section": section, "entries": saved},
+                      [section], {entry["fini"] for entry in saved})
         self.db.commit()
     
     def _get_section_schedule(self, section: str) -> List[Dict]:
         """Get formatted schedule for a section"""
         schedule = self.db.query(SCHEDULE).filter(SCHEDULE.section == section).all()
+        known = catalog.get(self.db)
         
         result = []
         for entry in schedule:
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == entry.subcode).first()
-            teacher = self.db.query(FACULTY).filter(FACULTY.initials == entry.fini).first()
-            
             result.append({
                 "id": entry.id,
                 "day_id": entry.day_id,
                 "period_id": entry.period_id,
                 "subcode": entry.subcode,
-                "subject_name": subject.name if subject else "Unknown",
+                "subject_name": known.subject_names.get(entry.subcode, "Unknown"),
                 "section": entry.section,
                 "fini": entry.fini,
-                "teacher_name": teacher.name if teacher else "Unknown"
+                "teacher_name": known.teacher_names.get(entry.fini, "Unknown")
             })
         
         return result
     
     def get_available_subjects(self) -> List[Dict]:
         """Get all available subjects"""
-        subjects = self.db.query(SUBJECTS).all()
-        return [
-            {
-                "code": subject.code,
-                "name": subject.name,
-                "credits": subject.credits,
-                "subtype": subject.subtype
-            }
-            for subject in subjects
-        ]
+        return [dict(subject) for subject in catalog.get(self.db).subjects.values()]
     
     def get_available_faculty(self) -> List[Dict]:
         """Get all available faculty"""
-        faculty_list = self.db.query(FACULTY).all()
         return [
             {
-                "id": faculty.id,
-                "name": faculty.name,
-                "initials": faculty.initials,
-                "email": faculty.email,
-                "subcode1": faculty.subcode1,
-                "subcode2": faculty.subcode2
+                "id": faculty["id"],
+                "name": faculty["name"],
+                "initials": faculty["initials"],
+                "email": faculty["email"],
+                "subcode1": faculty["subcode1"],
+                "subcode2": faculty["subcode2"]
             }
-            for faculty in faculty_list
+            for faculty in catalog.get(self.db).faculty_by_id.values()
         ]
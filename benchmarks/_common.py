@@ -0,0 +1,27 @@
+"""Helpers shared by the benchmark scripts: commit lookup and result files."""
+
+import json
+import os
+import subprocess
+from datetime import datetime
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def save_results(record: Dict, prefix: str, commit: Optional[str], output: Optional[str] = None) -> str:
+    """Write a run's JSON record, by default to benchmarks/results/<prefix>_<commit>_<time>.json"""
+    output = output or os.path.join(
+        RESULTS_DIR, f"{prefix}_{commit or 'nocommit'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(record, f, indent=2)
+    print(f"\nSaved results to {output}")
+    return output
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Measure how long `import main` takes in a fresh interpreter, i.e. the cost of a cold worker boot.
+
+Every run is a new subprocess with `-X importtime`. The script reports the
+median import time of main and the app's own overhead. The overhead is the
+summed self time of every module that main loads but the framework baseline
+does not; the baseline is FastAPI plus the SQLAlchemy ORM, which the app cannot
+avoid. Attributing by module keeps the figure stable even when whole-process
+timings are noisy. The script also lists the heaviest modules. It exits
+non-zero when the overhead exceeds --target-ms, or when a module that should be
+imported lazily (ReportLab, qrcode, the solver, ...) is loaded at import time.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --target-ms 150
+"""
+import argparse
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from _common import git_commit, save_results
+
+# Only needed by specific endpoints; importing them at boot is a regression
+LAZY_MODULES = [
+    "reportlab",
+    "qrcode",
+    "PIL",
+    "pdf_exporter",
+    "automated_timetable_generator",
+    "sqlalchemy.dialects.postgresql",
+]
+BASELINE = "import fastapi, sqlalchemy.orm"
+
+def measure(code: str, env: Dict[str, str]) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """Run `code` in a fresh interpreter; return total microseconds and (self, cumulative) per module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+    )
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        if not name.startswith("  "):
+            total += int(cumulative)
+        modules[name.strip()] = (int(own), int(cumulative))
+    return total, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--target-ms", type=float, default=200.0,
+                        help="Maximum import time of main beyond the FastAPI/SQLAlchemy baseline")
+    parser.add_argument("--top", type=int, default=12, help="Heaviest modules to list")
+    parser.add_argument("--output", help="Result JSON path (default benchmarks/results/import_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='timetable-import-'), 'import.db')}")
+    env["PYTHONDONTWRITEBYTECODE"] = "0"
+
+    # One warm-up pass so every run reads compiled bytecode
+    measure("import main", env)
+    framework = set(measure(BASELINE, env)[1])
+
+    main_runs: List[float] = []
+    overhead_runs: List[float] = []
+    module_runs: Dict[str, List[float]] = {}
+    loaded_lazy = set()
+    for _ in range(args.runs):
+        total, modules = measure("import main", env)
+        main_runs.append(total / 1000)
+        overhead_runs.append(sum(own for name, (own, _) in modules.items() if name not in framework) / 1000)
+        for name, (_, cumulative) in modules.items():
+            module_runs.setdefault(name, []).append(cumulative / 1000)
+        loaded_lazy.update(name for name in LAZY_MODULES if name in modules)
+
+    main_ms = statistics.median(main_runs)
+    overhead_ms = statistics.median(overhead_runs)
+    heaviest = sorted(
+        ((name, statistics.median(times)) for name, times in module_runs.items() if name not in framework and name != "main"),
+        key=lambda item: item[1], reverse=True
+    )[:args.top]
+
+    print(f"import main          {main_ms:8.1f} ms (median of {args.runs})")
+    print(f"app overhead         {overhead_ms:8.1f} ms beyond {BASELINE} (target {args.target_ms:.0f} ms)")
+    print("\nHeaviest modules outside the framework (cumulative):")
+    for name, ms in heaviest:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failures = []
+    if overhead_ms > args.target_ms:
+        failures.append(f"app overhead {overhead_ms:.1f} ms exceeds target {args.target_ms:.0f} ms")
+    if loaded_lazy:
+        failures.append(f"imported at boot but should be lazy: {', '.join(sorted(loaded_lazy))}")
+
+    commit = git_commit()
+    record = {
+        "benchmark": "import_time",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "results": {
+            "main_ms": round(main_ms, 1),
+            "overhead_ms": round(overhead_ms, 1),
+            "target_ms": args.target_ms,
+            "lazy_modules_loaded": sorted(loaded_lazy),
+            "heaviest": [{"module": name, "ms": round(ms, 1)} for name, ms in heaviest],
+        },
+    }
+    save_results(record, "import", commit, args.output)
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Time /students/search and /faculty/search queries against a synthetic institution.
+
+The benchmark seeds a fresh SQLite database (or --database-url) with
+--students students, creates the search indexes as init_db does, and then
+times a fixed set of prefix, substring and exact queries. It runs them once
+through the index (FTS5 on SQLite, pg_trgm on PostgreSQL) and once through the
+LIKE-scan fallback, and reports the median and p99 latency per query kind.
+
+    python benchmarks/search_benchmark.py
+    python benchmarks/search_benchmark.py --students 100000 --repeats 50
+"""
+import argparse
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from _common import git_commit, save_results
+
+# Keep database.py's module-level engine off the real database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy.orm import sessionmaker
+
+import models
+import search
+from database import create_tuned_engine
+from setup_database import setup_synthetic_institution
+
+def queries(institution: Dict) -> Dict[str, List[tuple]]:
+    """Query kind -> (entity, text) pairs drawn from the seeded data"""
+    students, faculty = institution["students"], institution["faculty"]
+    sample = students[len(students) // 2]
+    member = faculty[len(faculty) // 2]
+    return {
+        "short prefix": [("students", sample["name"][:2]), ("faculty", member["initials"][:2])],
+        "name prefix": [("students", sample["name"].split()[0][:4]), ("faculty", member["name"][:5])],
+        "substring": [("students", sample["name"].split()[-1][1:5]), ("faculty", member["email"].split("@")[0][2:6])],
+        "exact id": [("students", sample["id"]), ("faculty", member["initials"])],
+    }
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def time_queries(Session, cases: Dict[str, List[tuple]], repeats: int) -> Dict:
+    results = {}
+    db = Session()
+    try:
+        for kind, pairs in cases.items():
+            timings, hits = [], 0
+            for _ in range(repeats):
+                for entity, text in pairs:
+                    start = time.perf_counter()
+                    hits += len(search.search(db, entity, text))
+                    timings.append(time.perf_counter() - start)
+            results[kind] = {
+                "median_ms": round(statistics.median(timings) * 1000, 2),
+                "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+                "hits_per_query": round(hits / len(timings), 1),
+            }
+        results["backend"] = search.search_backend(db)
+    finally:
+        db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Scratch database (default: a fresh SQLite file). It is wiped.")
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Result JSON path (default benchmarks/results/search_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='timetable-search-'), 'bench.db')}"
+    engine = create_tuned_engine(url)
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        search.ensure_search_indexes(engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        db = Session()
+        try:
+            print(f"Seeding {args.students} students ...", flush=True)
+            institution = setup_synthetic_institution(
+                db, sections=args.sections, students=args.students, seed=args.seed, with_schedule=False
+            )
+        finally:
+            db.close()
+        cases = queries(institution)
+
+        indexed = time_queries(Session, cases, args.repeats)
+        # Force the LIKE-scan path for comparison
+        original = search.search_backend
+        search.search_backend = lambda db: "like"
+        try:
+            scan = time_queries(Session, cases, args.repeats)
+        finally:
+            search.search_backend = original
+    finally:
+        engine.dispose()
+
+    print(f"\n{'query':<14} {indexed['backend'] + ' median':>14} {'p99':>8} {'like median':>12} {'p99':>8} {'hits':>6}")
+    for kind in cases:
+        fast, slow = indexed[kind], scan[kind]
+        print(f"{kind:<14} {fast['median_ms']:>12.2f}ms {fast['p99_ms']:>6.2f}ms "
+              f"{slow['median_ms']:>10.2f}ms {slow['p99_ms']:>6.2f}ms {fast['hits_per_query']:>6}")
+
+    commit = git_commit()
+    record = {
+        "benchmark": "search",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": {"indexed": indexed, "like": scan},
+    }
+    save_results(record, "search", commit, args.output)
+
+if __name__ == "__main__":
+    main()
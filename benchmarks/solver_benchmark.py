@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Benchmark AutomatedTimetableGenerator over synthetic problem sizes.
+
+Every case in the grid of --sections x --subjects x --labs x --faculty-slack is
+built as a synthetic institution in a fresh in-memory SQLite database (one per
+seed). The benchmark then times generate_automated_timetable end to end and per
+phase, records how often every section was scheduled, and measures peak Python
+memory with tracemalloc in a separate pass so that it doesn't skew timings.
+
+    python benchmarks/solver_benchmark.py
+    python benchmarks/solver_benchmark.py --sections 3,6,12,24 --seeds 5
+    python benchmarks/solver_benchmark.py --labs 0,1,2,3 --faculty-slack 0,0.5 --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from _common import git_commit, save_results
+
+# Keep models/database from touching the real database on import
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from automated_timetable_generator import AutomatedTimetableGenerator
+from setup_database import bulk_insert, generate_institution
+
+# Generator method -> phase name. Times are exclusive: placement excludes the
+# conflict checks and the save it calls.
+PHASES = {
+    "_clear_section_schedule": "clear",
+    "_validate_assignments": "validate",
+    "_get_subject_requirements": "requirements",
+    "_schedule_subjects": "placement",
+    "_is_slot_available": "conflict_checks",
+    "_save_schedule_to_db": "save",
+    "_get_section_schedule": "readback",
+}
+
+class PhaseTimer:
+    """Accumulates exclusive wall time per phase across nested calls"""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._children: List[float] = []
+
+    def wrap(self, phase: str, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            self._children.append(0.0)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.totals[phase] += elapsed - self._children.pop()
+                self.calls[phase] += 1
+                if self._children:
+                    self._children[-1] += elapsed
+        return timed
+
+def build_problem(case: Dict, seed: int):
+    """Fresh in-memory database holding the case's subjects and faculty, plus the assignments"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    institution = generate_institution(
+        sections=case["sections"], students=0, theory_per_section=case["subjects"],
+        labs_per_section=case["labs"], faculty_slack=case["faculty_slack"], seed=seed
+    )
+    db = sessionmaker(bind=engine)()
+    bulk_insert(db, models.SUBJECTS, institution["subjects"])
+    bulk_insert(db, models.FACULTY, institution["faculty"])
+    db.commit()
+    return engine, db, institution
+
+def run_once(case: Dict, seed: int, trace_memory: bool = False) -> Dict:
+    engine, db, institution = build_problem(case, seed)
+    try:
+        generator = AutomatedTimetableGenerator(db)
+        # The generator defaults to sections A-C; scale it to the synthetic institution
+        generator.sections = institution["sections"]
+        timer = PhaseTimer()
+        for method, phase in PHASES.items():
+            setattr(generator, method, timer.wrap(phase, getattr(generator, method)))
+
+        random.seed(seed)  # the solver shuffles days with the global RNG
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        results = generator.generate_automated_timetable(institution["assignments"])
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        scheduled = sum(1 for result in results.values() if result.get("status") == "success")
+        phases = {phase: timer.totals.get(phase, 0.0) for phase in PHASES.values()}
+        phases["other"] = max(0.0, elapsed - sum(phases.values()))
+        return {
+            "seed": seed,
+            "total_s": elapsed,
+            "phases_s": phases,
+            "slot_checks": timer.calls.get("conflict_checks", 0),
+            "sections_scheduled": scheduled,
+            "sections": len(institution["sections"]),
+            "faculty": len(institution["faculty"]),
+            "success": scheduled == len(institution["sections"]),
+            "peak_memory_bytes": peak,
+        }
+    finally:
+        db.close()
+        engine.dispose()
+
+def run_case(case: Dict, seeds: List[int], measure_memory: bool) -> Dict:
+    runs = [run_once(case, seed) for seed in seeds]
+    totals = [run["total_s"] for run in runs]
+    summary = {
+        "case": case,
+        "label": case_label(case),
+        "faculty": runs[0]["faculty"],
+        "runs": len(runs),
+        "success_rate": sum(run["success"] for run in runs) / len(runs),
+        "section_success_rate": sum(run["sections_scheduled"] for run in runs) / sum(run["sections"] for run in runs),
+        "median_s": statistics.median(totals),
+        "min_s": min(totals),
+        "max_s": max(totals),
+        "slot_checks": statistics.median(run["slot_checks"] for run in runs),
+        "phases_median_s": {
+            phase: statistics.median(run["phases_s"][phase] for run in runs) for phase in runs[0]["phases_s"]
+        },
+        "peak_memory_bytes": run_once(case, seeds[0], trace_memory=True)["peak_memory_bytes"] if measure_memory else None,
+        "per_seed": runs,
+    }
+    return summary
+
+def case_label(case: Dict) -> str:
+    return f"sec={case['sections']} sub={case['subjects']} lab={case['labs']} slack={case['faculty_slack']:g}"
+
+def parse_list(value: str, kind=int) -> List:
+    return [kind(part) for part in value.split(",") if part.strip()]
+
+def print_table(summaries: List[Dict], previous: Optional[Dict] = None):
+    before = {entry["label"]: entry for entry in (previous or {}).get("results", [])}
+    phase_names = ["placement", "conflict_checks", "save", "readback"]
+
+    header = f"{'case':<32} {'fac':>4} {'ok':>6} {'sec ok':>7} {'median s':>9} {'max s':>8} {'checks':>8}"
+    header += "".join(f" {name[:10]:>10}" for name in phase_names) + f" {'peak MB':>8}"
+    if before:
+        header += f" {'Δ median':>9} {'Δ ok':>6}"
+    print("\n" + header)
+    print("-" * len(header))
+
+    for summary in summaries:
+        peak = summary["peak_memory_bytes"]
+        line = (f"{summary['label']:<32} {summary['faculty']:>4} {summary['success_rate']:>6.0%} "
+                f"{summary['section_success_rate']:>7.0%} {summary['median_s']:>9.3f} {summary['max_s']:>8.3f} "
+                f"{summary['slot_checks']:>8.0f}")
+        line += "".join(f" {summary['phases_median_s'][name]:>10.3f}" for name in phase_names)
+        line += f" {peak / 1048576:>8.1f}" if peak is not None else f" {'-':>8}"
+        old = before.get(summary["label"])
+        if old:
+            change = 100.0 * (summary["median_s"] - old["median_s"]) / old["median_s"] if old["median_s"] else 0.0
+            line += f" {change:>+8.1f}% {100 * (summary['success_rate'] - old['success_rate']):>+5.0f}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default="3,6,12", help="Comma-separated section counts")
+    parser.add_argument("--subjects", default="5", help="Theory subjects per section")
+    parser.add_argument("--labs", default="2", help="Lab subjects per section (the lab share)")
+    parser.add_argument("--faculty-slack", default="0.2",
+                        help="Spare faculty as a fraction of the minimum; lower means more sharing across sections")
+    parser.add_argument("--seeds", type=int, default=5, help="Seeds per case")
+    parser.add_argument("--first-seed", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", help="Result JSON path (default benchmarks/results/solver_<commit>_<time>.json)")
+    parser.add_argument("--compare", help="Previous result JSON to diff against")
+    args = parser.parse_args()
+
+    cases = [
+        {"sections": sections, "subjects": subjects, "labs": labs, "faculty_slack": slack}
+        for sections, subjects, labs, slack in itertools.product(
+            parse_list(args.sections), parse_list(args.subjects), parse_list(args.labs),
+            parse_list(args.faculty_slack, float)
+        )
+    ]
+    seeds = list(range(args.first_seed, args.first_seed + args.seeds))
+
+    summaries = []
+    for case in cases:
+        if case["labs"] > case["subjects"]:
+            print(f"Skipping {case_label(case)}: every lab pairs with a theory subject")
+            continue
+        print(f"Running {case_label(case)} over {len(seeds)} seeds ...", flush=True)
+        summaries.append(run_case(case, seeds, not args.no_memory))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_table(summaries, previous)
+
+    commit = git_commit()
+    record = {
+        "benchmark": "solver",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "seeds": seeds,
+        "results": summaries,
+    }
+    save_results(record, "solver", commit, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+from sqlalchemy.orm import Session
+from catalog import catalog
+from schedule_generator import ScheduleGenerator, schedule_version
+from render_cache import VersionedCache
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import functools
+import os
+
+# Bell schedule used to turn period numbers into wall-clock times
+CALENDAR_DAY_START = os.getenv("CALENDAR_DAY_START", "09:00")  # start of period 1 (HH:MM)
+CALENDAR_PERIOD_MINUTES = int(os.getenv("CALENDAR_PERIOD_MINUTES", "50"))
+CALENDAR_TERM_START = os.getenv("CALENDAR_TERM_START")  # YYYY-MM-DD, a Monday; CALENDAR_EPOCH if unset
+CALENDAR_TERM_WEEKS = os.getenv("CALENDAR_TERM_WEEKS")  # number of weekly repeats, unbounded if unset
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE")  # e.g. Asia/Kolkata, floating local time if unset
+
+# Generated feeds keyed by (kind, key), valid for one schedule version
+ICS_CACHE_MAX_ENTRIES = int(os.getenv("ICS_CACHE_MAX_ENTRIES", "1024"))
+ics_cache = VersionedCache(ICS_CACHE_MAX_ENTRIES)
+
+# Fixed Monday that unbounded feeds recur from. Events keep the same first
+# occurrence under the same UID, so clients keep their past occurrences.
+CALENDAR_EPOCH = date(2024, 1, 1)
+
+def _term_start() -> date:
+    if CALENDAR_TERM_START:
+        return datetime.strptime(CALENDAR_TERM_START, "%Y-%m-%d").date()
+    return CALENDAR_EPOCH
+
+def _timezone_weeks(term_start: date) -> int:
+    """Weeks the VTIMEZONE covers: the term, or for unbounded feeds until two years after this one"""
+    if CALENDAR_TERM_WEEKS:
+        return int(CALENDAR_TERM_WEEKS)
+    horizon = date(date.today().year + 2, 1, 1)
+    return max((horizon - term_start).days // 7 + 1, 1)
+
+@functools.lru_cache(maxsize=None)
+def _zone(name: Optional[str]):
+    """ZoneInfo for CALENDAR_TIMEZONE; None (floating times) if unset or unknown"""
+    if not name:
+        return None
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        print(f"Unknown CALENDAR_TIMEZONE {name!r}, writing floating times: {e}")
+        return None
+
+def _format_offset(offset: timedelta) -> str:
+    minutes = int(offset.total_seconds() // 60)
+    sign = "+" if minutes >= 0 else "-"
+    return f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+def _observance(zone, at_utc: datetime, offset_from: timedelta) -> List[str]:
+    """STANDARD or DAYLIGHT block for the offset in force from `at_utc`"""
+    local = at_utc.astimezone(zone)
+    kind = "DAYLIGHT" if local.dst() else "STANDARD"
+    return [
+        f"BEGIN:{kind}",
+        # DTSTART is the wall-clock time of the change, before it takes effect
+        f"DTSTART:{(at_utc + offset_from).strftime('%Y%m%dT%H%M%S')}",
+        f"TZOFFSETFROM:{_format_offset(offset_from)}",
+        f"TZOFFSETTO:{_format_offset(local.utcoffset())}",
+        f"TZNAME:{local.tzname()}",
+        f"END:{kind}",
+    ]
+
+def _vtimezone(tzid: str, zone, start: date, weeks: int) -> List[str]:
+    """
+    VTIMEZONE (RFC 5545 3.6.5) covering the term: the offset in force at the
+    start plus every transition before the end, found from the tz database.
+    """
+    step = timedelta(days=1)
+    moment = datetime.combine(start, time()).replace(tzinfo=timezone.utc) - step
+    end = moment + timedelta(weeks=weeks) + 2 * step
+    offset = moment.astimezone(zone).utcoffset()
+    lines = ["BEGIN:VTIMEZONE", f"TZID:{tzid}"] + _observance(zone, moment, offset)
+    while moment < end:
+        following = moment + step
+        if following.astimezone(zone).utcoffset() != offset:
+            # Narrow the change down to the minute
+            low, high = 0, 24 * 60
+            while high - low > 1:
+                middle = (low + high) // 2
+                if (moment + timedelta(minutes=middle)).astimezone(zone).utcoffset() == offset:
+                    low = middle
+                else:
+                    high = middle
+            change = moment + timedelta(minutes=high)
+            lines += _observance(zone, change, offset)
+            offset = change.astimezone(zone).utcoffset()
+        moment = following
+    lines.append("END:VTIMEZONE")
+    return lines
+
+def _escape_text(value) -> str:
+    """Escape a TEXT value per RFC 5545"""
+    text = "" if value is None else str(value)
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _fold(line: str) -> str:
+    """Fold a content line at 75 octets"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Don't split a multi-byte character
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+def _merge_consecutive(schedule: List[Dict]) -> List[Tuple[Dict, int]]:
+    """Collapse back-to-back periods of the same class (lab blocks) into one event"""
+    ordered = sorted(schedule, key=lambda e: (e['day_id'], e['section'], e['period_id']))
+    events = []
+    for entry in ordered:
+        if events:
+            first, length = events[-1]
+            if (first['day_id'] == entry['day_id'] and first['section'] == entry['section']
+                    and first['subcode'] == entry['subcode'] and first['fini'] == entry['fini']
+                    and first['period_id'] + length == entry['period_id']):
+                events[-1] = (first, length + 1)
+                continue
+        events.append((entry, 1))
+    return events
+
+def render_calendar(name: str, schedule: List[Dict], kind: str) -> bytes:
+    """Render schedule entries as an iCalendar feed of weekly recurring events"""
+    term_start = _term_start()
+    day_start = datetime.strptime(CALENDAR_DAY_START, "%H:%M")
+    dtstamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    zone = _zone(CALENDAR_TIMEZONE)
+    tzid = f";TZID={CALENDAR_TIMEZONE}" if zone else ""
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Timetable Creator//Timetable API//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape_text(name)}",
+    ]
+    if zone:
+        lines.append(f"X-WR-TIMEZONE:{CALENDAR_TIMEZONE}")
+        lines.extend(_vtimezone(CALENDAR_TIMEZONE, zone, term_start, _timezone_weeks(term_start)))
+
+    rrule = "RRULE:FREQ=WEEKLY"
+    if CALENDAR_TERM_WEEKS:
+        rrule += f";COUNT={int(CALENDAR_TERM_WEEKS)}"
+
+    for entry, length in _merge_consecutive(schedule):
+        if not entry['day_id'] or not entry['period_id']:
+            continue
+
+        event_day = term_start + timedelta(days=entry['day_id'] - 1)
+        start_offset = timedelta(minutes=(entry['period_id'] - 1) * CALENDAR_PERIOD_MINUTES)
+        start = datetime.combine(event_day, day_start.time()) + start_offset
+        end = start + timedelta(minutes=length * CALENDAR_PERIOD_MINUTES)
+
+        if kind == "faculty":
+            summary = f"{entry['subject_name']} - Section {entry['section']}"
+        else:
+            summary = f"{entry['subject_name']} ({entry['fini']})"
+        description = f"{entry['subcode']} / Section {entry['section']} / {entry['fini']}"
+
+        lines.extend([
+            "BEGIN:VEVENT",
+            f"UID:{entry['id']}@timetable",
+            f"DTSTAMP:{dtstamp}",
+            f"DTSTART{tzid}:{start.strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND{tzid}:{end.strftime('%Y%m%dT%H%M%S')}",
+            rrule,
+            f"SUMMARY:{_escape_text(summary)}",
+            f"DESCRIPTION:{_escape_text(description)}",
+            "END:VEVENT",
+        ])
+
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode("utf-8")
+
+class CalendarExporter:
+    def __init__(self, db: Session):
+        self.db = db
+        self.generator = ScheduleGenerator(db)
+
+    def export_section_calendar(self, section: str) -> Tuple[bytes, str]:
+        """Return (ics bytes, version) for a section's timetable"""
+        schedule = self.generator.get_schedule_by_section(section)
+        return self._cached_render(("section", section), f"Section {section} Timetable", schedule, "section")
+
+    def export_faculty_calendar(self, fini: str) -> Tuple[bytes, str]:
+        """Return (ics bytes, version) for a faculty member's timetable"""
+        faculty = catalog.get(self.db, faculty=[fini]).faculty(fini)
+        if not faculty:
+            raise ValueError(f"Faculty with initials {fini} not found")
+
+        schedule = self.generator.get_schedule_by_teacher(fini)
+        return self._cached_render(("faculty", fini), f"{faculty['name']} ({fini}) Timetable", schedule, "faculty")
+
+    def _cached_render(self, cache_key: Tuple[str, str], name: str, schedule: List[Dict], kind: str) -> Tuple[bytes, str]:
+        # The VTIMEZONE of an unbounded feed grows once a year, and that is a new version too
+        term_start = _term_start()
+        version = schedule_version(schedule + [{"name": name, "term_start": term_start.isoformat(),
+                                                "timezone_weeks": _timezone_weeks(term_start)}])
+        ics = ics_cache.get(cache_key, version)
+        if ics is None:
+            ics = render_calendar(name, schedule, kind)
+            ics_cache.put(cache_key, version, ics)
+        return ics, version
@@ -0,0 +1,133 @@
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+
+from models import SUBJECTS, FACULTY
+from subject_requirements import subject_requirement
+
+# How long a loaded catalog is trusted; CRUD in this process invalidates at once,
+# other workers see the change within this many seconds
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "60"))
+# A lookup of a code the snapshot lacks reloads at most this often, so rows created
+# on another worker are found at once while bad codes stay cheap
+CATALOG_MISS_RELOAD_SECONDS = 1.0
+
+SUBJECT_FIELDS = ["code", "name", "credits", "subtype"]
+FACULTY_FIELDS = ["id", "name", "initials", "email", "subcode1", "subcode2", "max_periods_per_day"]
+# Fields listed by /automated/faculty
+FACULTY_LIST_FIELDS = ["id", "name", "initials", "email", "subcode1", "subcode2"]
+
+class CatalogSnapshot:
+    """
+    Immutable copy of SUBJECTS and FACULTY (without passwords) with dict lookups,
+    every subject's scheduling requirement and the catalog endpoints' JSON
+    bodies, all computed once at load time.
+    """
+
+    def __init__(self, subjects: List[Dict], faculty: List[Dict]):
+        self.subjects: Dict[str, Dict] = {subject["code"]: subject for subject in subjects}
+        self.faculty_by_initials: Dict[str, Dict] = {member["initials"]: member for member in faculty}
+        self.faculty_by_id: Dict[int, Dict] = {member["id"]: member for member in faculty}
+        # Name maps in the shape format_entry takes
+        self.subject_names: Dict[str, str] = {subject["code"]: subject["name"] for subject in subjects}
+        self.teacher_names: Dict[str, str] = {member["initials"]: member["name"] for member in faculty}
+        # Subject code -> subject_requirement(), or the reason it has none
+        self.requirements: Dict[str, Dict] = {}
+        self.requirement_errors: Dict[str, str] = {}
+        for subject in subjects:
+            try:
+                self.requirements[subject["code"]] = subject_requirement(subject)
+            except ValueError as e:
+                self.requirement_errors[subject["code"]] = str(e)
+        self.subjects_json = json.dumps({"subjects": subjects}).encode()
+        self.faculty_json = json.dumps(
+            {"faculty": [{field: member[field] for field in FACULTY_LIST_FIELDS} for member in faculty]}
+        ).encode()
+        self.version = hashlib.sha256(self.subjects_json + b"\n" + self.faculty_json).hexdigest()[:16]
+
+    def subject(self, code: str) -> Optional[Dict]:
+        return self.subjects.get(code)
+
+    def faculty(self, initials: str) -> Optional[Dict]:
+        return self.faculty_by_initials.get(initials)
+
+    def requirement(self, code: str) -> Dict:
+        """A subject's requirement; ValueError if it is unknown or has no credits"""
+        if code in self.requirements:
+            return self.requirements[code]
+        if code in self.requirement_errors:
+            raise ValueError(self.requirement_errors[code])
+        raise ValueError(f"Subject with code {code} not found")
+
+    def requirements_for(self, codes: Iterable[str]) -> Dict[str, Dict]:
+        """Requirements of many subjects at once; unknown and credit-less codes are left out"""
+        return {code: self.requirements[code] for code in codes if code in self.requirements}
+
+class CatalogRegistry:
+    """
+    Process-wide catalog of subjects and faculty.
+
+    Both tables are small, so they are loaded whole into a CatalogSnapshot that
+    readers share without locking; a reload swaps in a new snapshot. Snapshots
+    are kept per engine, so tools that point sessions at other databases never
+    see each other's catalog.
+    """
+
+    def __init__(self, ttl: float = CATALOG_TTL):
+        self.ttl = ttl
+        self._snapshots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session) -> CatalogSnapshot:
+        subjects = [
+            {field: getattr(row, field) for field in SUBJECT_FIELDS}
+            for row in db.query(*[getattr(SUBJECTS, field) for field in SUBJECT_FIELDS]).order_by(SUBJECTS.code)
+        ]
+        faculty = [
+            {field: getattr(row, field) for field in FACULTY_FIELDS}
+            for row in db.query(*[getattr(FACULTY, field) for field in FACULTY_FIELDS]).order_by(FACULTY.id)
+        ]
+        return CatalogSnapshot(subjects, faculty)
+
+    def get(self, db: Session, subjects: Iterable[str] = (), faculty: Iterable[str] = ()) -> CatalogSnapshot:
+        """
+        The current snapshot for the session's database, loading it if missing or
+        expired. Subject codes and faculty initials the caller is about to look up
+        may be passed; if the snapshot lacks any, it is reloaded first (at most once
+        per CATALOG_MISS_RELOAD_SECONDS) in case another worker just created them.
+        """
+        bind = db.get_bind()
+        cached = self._snapshots.get(bind)
+        if cached is None or time.monotonic() - cached[0] > self.ttl:
+            with self._lock:
+                cached = self._snapshots.get(bind)
+                if cached is None or time.monotonic() - cached[0] > self.ttl:
+                    cached = (time.monotonic(), self._load(db))
+                    self._snapshots[bind] = cached
+        snapshot = cached[1]
+        missing = any(code is not None and code not in snapshot.subjects for code in subjects) or \
+            any(initials is not None and initials not in snapshot.faculty_by_initials for initials in faculty)
+        if missing:
+            with self._lock:
+                cached = self._snapshots.get(bind)
+                if cached is None or time.monotonic() - cached[0] > CATALOG_MISS_RELOAD_SECONDS:
+                    cached = (time.monotonic(), self._load(db))
+                    self._snapshots[bind] = cached
+                snapshot = cached[1]
+        return snapshot
+
+    async def get_async(self, db, subjects: Iterable[str] = (), faculty: Iterable[str] = ()) -> CatalogSnapshot:
+        """get() for an AsyncSession"""
+        return await db.run_sync(lambda session: self.get(session, subjects, faculty))
+
+    def invalidate(self):
+        """Drop every snapshot; the next lookup reloads. Called by the subject and faculty CRUD endpoints."""
+        with self._lock:
+            self._snapshots.clear()
+
+catalog = CatalogRegistry()
@@ -0,0 +1,154 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import asyncio
+import itertools
+import json
+import os
+
+from models import SCHEDULE
+
+# Messages a slow client may have waiting before it is told to resync instead
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+# Seconds between keep-alives on an idle stream
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+
+# Session.info key holding changes recorded in the current transaction
+PENDING_KEY = "schedule_changes"
+
+RESYNC_MESSAGE = json.dumps({"op": "resync"}, separators=(",", ":"))
+HEARTBEAT_MESSAGE = json.dumps({"op": "heartbeat"}, separators=(",", ":"))
+
+# (event, sections it concerns, faculty it concerns); None means everyone
+Change = Tuple[Dict, Optional[Set[str]], Optional[Set[str]]]
+
+def entry_delta(entry: SCHEDULE) -> Dict:
+    return {
+        "id": entry.id,
+        "day_id": entry.day_id,
+        "period_id": entry.period_id,
+        "subcode": entry.subcode,
+        "section": entry.section,
+        "fini": entry.fini,
+    }
+
+class Subscription:
+    """One client's filter and bounded queue of serialized events"""
+
+    def __init__(self, sections: Iterable[str], faculty: Iterable[str], queue_size: int):
+        self.sections = set(sections)
+        self.faculty = set(faculty)
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+
+    def wants(self, sections: Optional[Set[str]], faculty: Optional[Set[str]]) -> bool:
+        if not self.sections and not self.faculty:
+            return True
+        if sections is None or faculty is None:
+            return True
+        return bool(self.sections & sections) or bool(self.faculty & faculty)
+
+    def offer(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client fell behind: drop its backlog and have it refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_MESSAGE)
+
+class ChangeFeed:
+    """
+    In-process fan-out of committed SCHEDULE changes to subscribed clients.
+
+    Write paths record changes on their session (record_change); they are
+    published once the transaction commits and dropped on rollback. Publishing
+    is thread-safe: events hop onto the event loop, which numbers them and
+    hands one serialized copy to every interested subscriber's queue.
+    """
+
+    def __init__(self, queue_size: int = CHANGE_FEED_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = itertools.count(1)
+
+    def subscribe(self, sections: Iterable[str] = (), faculty: Iterable[str] = ()) -> Subscription:
+        """Called on the event loop; no filters means every change"""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(sections, faculty, self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, changes: List[Change]):
+        if self._loop is None or not self._subscribers or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._deliver, changes)
+
+    def _deliver(self, changes: List[Change]):
+        for change, sections, faculty in changes:
+            message = json.dumps({"seq": next(self._seq), **change}, separators=(",", ":"), default=str)
+            for subscription in self._subscribers:
+                if subscription.wants(sections, faculty):
+                    subscription.offer(message)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+feed = ChangeFeed()
+
+def record_change(db: Session, change: Dict, sections: Optional[Iterable[str]], faculty: Optional[Iterable[str]]):
+    """Queue a change on the session; it is published when the session commits"""
+    concerns = (
+        None if sections is None else {s for s in sections if s},
+        None if faculty is None else {f for f in faculty if f},
+    )
+    db.info.setdefault(PENDING_KEY, []).append((change, *concerns))
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        feed.publish(pending)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session):
+    session.info.pop(PENDING_KEY, None)
+
+async def sse_events(subscription: Subscription) -> AsyncIterator[bytes]:
+    """Server-sent events for a subscription, with keep-alive comments while idle"""
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), CHANGE_FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield f"data: {message}\n\n".encode()
+    finally:
+        feed.unsubscribe(subscription)
+
+async def websocket_events(websocket, subscription: Subscription):
+    """Send a subscription's events over an accepted WebSocket until the client goes away"""
+
+    async def wait_for_close():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    closed = asyncio.ensure_future(wait_for_close())
+    try:
+        while not closed.done():
+            message = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({message, closed}, timeout=CHANGE_FEED_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+            if message in done:
+                await websocket.send_text(message.result())
+                continue
+            message.cancel()
+            if not closed.done():
+                await websocket.send_text(HEARTBEAT_MESSAGE)
+    finally:
+        closed.cancel()
+        feed.unsubscribe(subscription)
@@ -1,5 +1,9 @@
+from collections import Counter
+from typing import Dict, List
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from models import SUBJECTS, SCHEDULE
+from models import SCHEDULE
+from catalog import catalog
 
 class CreditValidator:
     def __init__(self, db: Session):
@@ -7,25 +11,8 @@ class CreditValidator:
     
     def calculate_periods_needed(self, subcode: str) -> int:
         """Calculate number of periods needed per week based on subject credits and type"""
-        subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
-        if not subject:
-            raise ValueError(f"Subject with code {subcode} not found")
-        
-        if not subject.credits:
-            raise ValueError(f"Subject {subcode} has no credits defined")
-        
-        # For theory subjects ('T'): credits = number of classes per week
-        if subject.subtype.upper() == 'T':
-            return int(subject.credits)
-        
-        # For lab subjects ('L'/'P'): classes per week = 2 × credits
-        elif subject.subtype.upper() in ['L', 'P']:
-            periods_needed = int(2 * subject.credits)
-            return periods_needed
-        
-        else:
-            # Default to credits if subject type is unknown
-            return int(subject.credits)
+        # Theory: credits classes per week; labs: 2 x credits (see subject_requirements)
+        return catalog.get(self.db, subjects=[subcode]).requirement(subcode)["periods_needed"]
     
     def get_current_periods_count(self, subcode: str, section: str) -> int:
         """Get current number of periods scheduled for a subject in a section"""
@@ -39,7 +26,7 @@ class CreditValidator:
         """Validate if a schedule entry can be added without exceeding credit limits"""
         try:
             # Check if subject exists
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
+            subject = catalog.get(self.db, subjects=[subcode]).subject(subcode)
             if not subject:
                 return {
                     "valid": False,
@@ -56,7 +43,7 @@ class CreditValidator:
             if current_periods >= max_periods:
                 return {
                     "valid": False,
-                    "message": f"Cannot add more classes for {subject.name} ({subcode}). Maximum {max_periods} classes allowed, but {current_periods} already scheduled."
+                    "message": f"Cannot add more classes for {subject['name']} ({subcode}). Maximum {max_periods} classes allowed, but {current_periods} already scheduled."
                 }
             
             # Check for slot conflicts
@@ -74,7 +61,7 @@ class CreditValidator:
             
             return {
                 "valid": True,
-                "message": f"Can add {subject.name} ({subcode}) to Section {section}, Day {day_id}, Period {period_id}"
+                "message": f"Can add {subject['name']} ({subcode}) to Section {section}, Day {day_id}, Period {period_id}"
             }
             
         except Exception as e:
@@ -82,3 +69,73 @@ class CreditValidator:
                 "valid": False,
                 "message": f"Validation error: {str(e)}"
             }
+    
+    def validate_plan(self, section: str, entries: List[Dict], replace: bool = True) -> Dict:
+        """
+        Check a whole proposed timetable for a section in one pass and report every violation.
+        
+        entries are {day_id, period_id, subcode, fini}. With replace the plan stands in for the
+        section's current entries; otherwise it is added to them. The catalog comes from the
+        registry and SCHEDULE is read with a single query.
+        """
+        known = catalog.get(self.db, subjects={entry["subcode"] for entry in entries},
+                            faculty={entry["fini"] for entry in entries})
+        violations = []
+        
+        def violation(index, kind, message, **details):
+            violations.append({"index": index, "type": kind, "message": message, **details})
+        
+        # Current entries of this section, and of every teacher the plan uses
+        finis = {entry["fini"] for entry in entries if entry.get("fini")}
+        existing = self.db.query(SCHEDULE.day_id, SCHEDULE.period_id, SCHEDULE.subcode, SCHEDULE.section, SCHEDULE.fini).filter(
+            or_(SCHEDULE.section == section, SCHEDULE.fini.in_(finis))
+        ).all()
+        
+        section_slots = {}
+        teacher_slots = {}
+        planned = Counter()
+        for row in existing:
+            if row.section == section:
+                if replace:
+                    continue
+                section_slots[(row.day_id, row.period_id)] = f"existing {row.subcode}"
+                planned[row.subcode] += 1
+            if row.fini in finis:
+                teacher_slots.setdefault((row.fini, row.day_id, row.period_id), row.section)
+        
+        for index, entry in enumerate(entries):
+            subcode, fini = entry["subcode"], entry["fini"]
+            slot = (entry["day_id"], entry["period_id"])
+            where = f"day {slot[0]}, period {slot[1]}"
+            
+            if not known.subject(subcode):
+                violation(index, "unknown_subject", f"Subject {subcode} not found")
+            if not known.faculty(fini):
+                violation(index, "unknown_faculty", f"Teacher with initials {fini} not found")
+            
+            if slot in section_slots:
+                violation(index, "slot_collision", f"Section {section} already has {section_slots[slot]} at {where}")
+            else:
+                section_slots[slot] = f"{subcode} (entry {index})"
+            
+            other_section = teacher_slots.get((fini, slot[0], slot[1]))
+            if other_section is not None and other_section != section:
+                violation(index, "teacher_collision", f"Teacher {fini} already has a class at {where} in section {other_section}")
+            
+            planned[subcode] += 1
+        
+        # Per-subject credit budgets over the whole plan
+        subjects = {}
+        for subcode, count in planned.items():
+            requirement = known.requirements.get(subcode)
+            if requirement is None:
+                if subcode in known.requirement_errors:
+                    violation(None, "credit_budget", known.requirement_errors[subcode], subcode=subcode)
+                continue
+            subjects[subcode] = {"planned": count, "required": requirement["periods_needed"]}
+            if count > requirement["periods_needed"]:
+                violation(None, "credit_budget",
+                          f"{requirement['name']} ({subcode}) has {count} classes planned; at most {requirement['periods_needed']} allowed",
+                          subcode=subcode)
+        
+        return {"valid": not violations, "section": section, "violations": violations, "subjects": subjects}
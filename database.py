@@ -1,11 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 
 from sqlalchemy.ext.declarative import declarative_base
 
 from sqlalchemy.orm import sessionmaker
 
+from contextvars import ContextVar
+
+import itertools
+
 import os
 
+import time
+
 from dotenv import load_dotenv
 
 
@@ -25,16 +31,265 @@ if not DATABASE_URL:
 
 
 
-engine = create_engine(DATABASE_URL)
+# Per-backend tuning profiles, selected with DB_PROFILE (default "balanced").
+# "default" leaves the driver untouched: rollback journal, synchronous=FULL and
+# no busy timeout on SQLite, SQLAlchemy's 5+10 pool without pre-ping on PostgreSQL.
+DB_PROFILE = os.getenv("DB_PROFILE", "balanced")
+
+SQLITE_PROFILES = {
+    "default": {},
+    # WAL lets readers run alongside a writer; NORMAL only fsyncs at checkpoints
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,  # KiB, i.e. 64 MiB of page cache per connection
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    # Same concurrency as balanced but fsync on every commit
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+    },
+}
+
+POSTGRES_PROFILES = {
+    "default": {},
+    "balanced": {"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True, "pool_recycle": 1800, "pool_timeout": 30},
+    "durable": {"pool_size": 5, "max_overflow": 5, "pool_pre_ping": True, "pool_recycle": 1800, "pool_timeout": 30},
+}
+
+def _backend(url: str) -> str:
+    return url.partition("://")[0].split("+")[0]
+
+def sqlite_pragmas(profile: str = DB_PROFILE) -> dict:
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}'; choose from {', '.join(SQLITE_PROFILES)}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    if os.getenv("SQLITE_BUSY_TIMEOUT_MS"):
+        pragmas["busy_timeout"] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS"))
+    return pragmas
+
+def pool_options(profile: str = DB_PROFILE) -> dict:
+    if profile not in POSTGRES_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}'; choose from {', '.join(POSTGRES_PROFILES)}")
+    options = dict(POSTGRES_PROFILES[profile])
+    if os.getenv("DB_POOL_SIZE"):
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE"))
+    if os.getenv("DB_MAX_OVERFLOW"):
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW"))
+    return options
+
+def apply_tuning(sync_engine, profile: str = DB_PROFILE, read_only: bool = False):
+    """Run the profile's PRAGMAs on every new SQLite connection (sync or async driver)"""
+    if sync_engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(profile)
+    if read_only:
+        # Switching journal mode is a write; read-only connections inherit the file's mode
+        pragmas.pop("journal_mode", None)
+    if not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def create_tuned_engine(url: str, profile: str = DB_PROFILE, read_only: bool = False, **kwargs):
+    """create_engine with the profile's pool options (PostgreSQL) or connect-time PRAGMAs (SQLite)"""
+    options = pool_options(profile) if _backend(url) in ("postgresql", "postgres") else {}
+    options.update(kwargs)
+    tuned = create_engine(url, **options)
+    apply_tuning(tuned, profile, read_only)
+    return tuned
+
+
+
+engine = create_tuned_engine(DATABASE_URL)
+
+
+
+# Opt-in statement timing and slow-query EXPLAIN capture (report at /admin/query-profile)
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "").lower() in ("1", "true", "yes")
+
+if QUERY_PROFILING:
+    from query_profiler import enable_query_profiling
+    enable_query_profiling(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 
+# Read routing: read-only endpoints use get_read_db, which goes to the replicas in
+# READ_REPLICA_URLS or, on a WAL-mode SQLite file, to a separate read-only pool on
+# the same file. Writes stay on `engine`. A client that wrote within the last
+# READ_YOUR_WRITES_SECONDS (tracked by a header or cookie, see ReadYourWritesMiddleware)
+# reads from the primary so replica lag never hides its own changes.
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()]
+
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+LAST_WRITE_COOKIE = "tt_last_write"
+
+# Same marker as a header, for cross-origin clients that don't send cookies: responses
+# to writes carry it and the client echoes it back on its following requests
+LAST_WRITE_HEADER = "X-Last-Write"
+
+
+
+def _sqlite_read_only_url(url: str):
+    """URL opening the same SQLite file read-only, or None for in-memory databases"""
+    scheme, _, path = url.partition("://")
+    if path in ("", "/", "/:memory:") or path.startswith("/file:"):
+        return None
+    return f"{scheme}:///file:{path[1:]}?mode=ro&uri=true"
+
+
+
+def read_urls(url: str = DATABASE_URL) -> list:
+    if READ_REPLICA_URLS:
+        return READ_REPLICA_URLS
+    if _backend(url) == "sqlite" and str(sqlite_pragmas().get("journal_mode", "")).upper() == "WAL":
+        read_only_url = _sqlite_read_only_url(url)
+        return [read_only_url] if read_only_url else []
+    return []
+
+
+
+read_engines = [create_tuned_engine(url, read_only=True) for url in read_urls()] or [engine]
+
+if QUERY_PROFILING:
+    for read_engine in read_engines:
+        enable_query_profiling(read_engine)
+
+_read_sessions = itertools.cycle([
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine) for read_engine in read_engines
+])
+
+
+
+# Per-request routing state set by ReadYourWritesMiddleware; a dict so threadpool
+# workers (which run in a copy of the context) update the same object
+_routing: ContextVar = ContextVar("db_routing", default=None)
+
+
+
+def reads_pinned_to_primary() -> bool:
+    state = _routing.get()
+    return bool(state and state["pinned"])
+
+
+
+def _mark_write():
+    state = _routing.get()
+    if state is not None:
+        state["wrote"] = True
+
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _record_write(session, flush_context):
+    _mark_write()
+
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _record_statement_write(orm_execute_state):
+    # Query.delete()/update() and Core insert/update/delete statements never flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+
+
+class ReadYourWritesMiddleware:
+    """Pin reads to the primary for clients that wrote recently, and mark clients that write"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = {"pinned": self._wrote_recently(scope), "wrote": False}
+        token = _routing.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["wrote"]:
+                written_at = str(int(time.time()))
+                cookie = f"{LAST_WRITE_COOKIE}={written_at}; Max-Age={READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode()),
+                    (LAST_WRITE_HEADER.lower().encode(), written_at.encode()),
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _routing.reset(token)
+
+    @staticmethod
+    def _wrote_recently(scope) -> bool:
+        header = LAST_WRITE_HEADER.lower().encode()
+        for name, value in scope.get("headers", []):
+            written_at = None
+            if name == header:
+                written_at = value.decode("latin-1").strip()
+            elif name == b"cookie":
+                for part in value.decode("latin-1").split(";"):
+                    key, _, cookie_value = part.strip().partition("=")
+                    if key == LAST_WRITE_COOKIE:
+                        written_at = cookie_value
+            if written_at and written_at.isdigit() and time.time() - int(written_at) < READ_YOUR_WRITES_SECONDS:
+                return True
+        return False
+
+
+
 Base = declarative_base()
 
 
 
+def init_db():
+    """Create any missing tables; run once per deploy rather than on every worker boot"""
+    import models  # registers the tables on Base
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateIndex
+    from search import ensure_search_indexes
+    Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist; add columns and indexes declared since
+    existing = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            present = {column["name"] for column in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    ensure_search_indexes(engine)
+    # Schedule history starts from whatever the table holds now
+    from schedule_history import ensure_baseline_snapshot
+    db = SessionLocal()
+    try:
+        ensure_baseline_snapshot(db)
+    finally:
+        db.close()
+
+
+
 def get_db():
 
     db = SessionLocal()
@@ -47,3 +302,125 @@ def get_db():
 
         db.close()
 
+
+
+def read_session():
+    """New session on a read engine (the primary when pinned); the caller closes it"""
+    return SessionLocal() if reads_pinned_to_primary() else next(_read_sessions)()
+
+
+
+def get_read_db():
+
+    db = read_session()
+
+    try:
+
+        yield db
+
+    finally:
+
+        db.close()
+
+
+
+# Async engine for the read-heavy endpoints (aiosqlite / asyncpg); writes, admin
+# and solver paths stay on the sync SessionLocal above
+def _async_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart"""
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+")[0]
+    if backend == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if backend in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "10"))
+
+_async_engine = None
+
+_AsyncSessionLocal = None
+
+_async_read_engines = []
+
+_async_read_sessions = None
+
+
+
+def _create_async_engine(url: str, read_only: bool = False):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    options = {}
+    scheme, _, path = url.partition("://")
+    if scheme.startswith("sqlite") and path not in ("", "/:memory:"):
+        # aiosqlite defaults to NullPool, which opens a connection and thread per request
+        options = {"poolclass": AsyncAdaptedQueuePool, "pool_size": ASYNC_POOL_SIZE}
+    elif _backend(url) == "postgresql":
+        options = pool_options()
+    async_engine = create_async_engine(url, **options)
+    apply_tuning(async_engine.sync_engine, read_only=read_only)
+    if QUERY_PROFILING:
+        enable_query_profiling(async_engine.sync_engine)
+    return async_engine
+
+
+
+def get_async_engine():
+    """Create the async engines on first use so sync-only processes never load the async driver"""
+    global _async_engine, _AsyncSessionLocal, _async_read_engines, _async_read_sessions
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False)
+        _async_read_engines = [_create_async_engine(_async_url(url), read_only=True) for url in read_urls()]
+        _async_read_sessions = itertools.cycle([
+            async_sessionmaker(read_engine, expire_on_commit=False) for read_engine in _async_read_engines
+        ] or [_AsyncSessionLocal])
+    return _async_engine
+
+
+
+def async_engines() -> list:
+    get_async_engine()
+    return [_async_engine] + _async_read_engines
+
+
+
+async def get_async_db():
+
+    get_async_engine()
+
+    async with _AsyncSessionLocal() as db:
+
+        yield db
+
+
+
+def async_read_session():
+    """New AsyncSession on a read engine (the primary when pinned); the caller closes it"""
+    get_async_engine()
+    return _AsyncSessionLocal() if reads_pinned_to_primary() else next(_async_read_sessions)()
+
+
+
+async def get_async_read_db():
+
+    async with async_read_session() as db:
+
+        yield db
+
+
+
+async def dispose_async_engine():
+
+    for async_engine in async_engines() if _async_engine is not None else []:
+
+        await async_engine.dispose()
+
@@ -1,24 +1,72 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, WebSocket
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import io
 import models
 import schemas
-from database import get_db, engine
-from schedule_generator import ScheduleGenerator
+from database import get_db, get_read_db, get_async_read_db, read_session, async_read_session, async_engines, dispose_async_engine, engine, read_engines, init_db, ReadYourWritesMiddleware, LAST_WRITE_HEADER
+from schedule_generator import ScheduleGenerator, AsyncScheduleReader
+from search import search, repair_stale_search_indexes, SEARCH_MAX_LIMIT
+from catalog import catalog
+from pagination import keyset, set_next_cursor, stream_ndjson, stream_ndjson_async, model_serializer, NDJSON_MEDIA_TYPE, NEXT_CURSOR_HEADER
 from credit_validator import CreditValidator
-from automated_timetable_generator import AutomatedTimetableGenerator
-from auth import authenticate_admin, create_access_token, get_current_admin, timedelta, verify_password, get_password_hash
+from calendar_exporter import CalendarExporter
+from auth import authenticate_admin, create_access_token, get_current_admin, get_current_student, get_current_staff, verify_token_and_get_payload, timedelta, verify_password, get_password_hash
+import attendance
+import change_feed
+import schedule_history
+import qr_generator
+from metrics import MetricsMiddleware, instrument_engine, render_metrics
+from query_profiler import profiler as query_profiler
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
+import json
+import os
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# The PDF exporter (ReportLab) and the automated solver are imported inside their
+# endpoints so worker boot doesn't pay for them. Tables are created by
+# `python setup_database.py --schema-only` at deploy time, not on every import;
+# set AUTO_CREATE_SCHEMA=1 to create missing tables at startup in development.
 
 app = FastAPI(title="Timetable Creator API", version="1.0.0")
 
+@app.on_event("startup")
+def start_background_workers():
+    if os.getenv("AUTO_CREATE_SCHEMA", "").lower() in ("1", "true", "yes"):
+        init_db()
+    for async_engine in async_engines():
+        instrument_engine(async_engine.sync_engine)
+    _preload_catalog()
+    _check_search_indexes()
+    attendance.write_buffer.start()
+
+def _preload_catalog():
+    """Load the catalog registry before the first request; skipped if the schema isn't there yet"""
+    db = read_session()
+    try:
+        catalog.get(db)
+    except Exception as e:
+        print(f"Catalog not preloaded, loading on first use: {e}")
+    finally:
+        db.close()
+
+def _check_search_indexes():
+    """Rebuild search indexes a VACUUM left behind; skipped if the schema isn't there yet"""
+    try:
+        repair_stale_search_indexes(engine)
+    except Exception as e:
+        print(f"Search indexes not checked: {e}")
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    # Flush queued check-ins before the worker exits
+    attendance.write_buffer.stop()
+    await dispose_async_engine()
+
 @app.get("/")
 def read_root():
     return {
@@ -35,8 +83,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the paging cursor and the read-your-writes marker
+    expose_headers=[NEXT_CURSOR_HEADER, LAST_WRITE_HEADER],
 )
 
+# Per-route latency, response size and SQL statement counts, exposed at /metrics
+for counted_engine in [engine] + read_engines:
+    instrument_engine(counted_engine)
+app.add_middleware(MetricsMiddleware)
+
+# Reads go to replicas / the read-only pool unless this client wrote within READ_YOUR_WRITES_SECONDS
+app.add_middleware(ReadYourWritesMiddleware)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/query-profile")
+def get_query_profile(limit: int = 50, order_by: str = "total_ms", current_user: str = Depends(get_current_admin)):
+    """Per-fingerprint SQL timings (enable with QUERY_PROFILING=1)"""
+    if order_by not in ("total_ms", "count", "p50_ms", "p95_ms", "max_ms", "slow_count"):
+        raise HTTPException(status_code=400, detail=f"Cannot order by {order_by}")
+    return query_profiler.report(limit, order_by)
+
+@app.delete("/admin/query-profile")
+def reset_query_profile(current_user: str = Depends(get_current_admin)):
+    query_profiler.reset()
+    return {"message": "Query profile reset"}
+
 # Authentication schemas
 class LoginRequest(BaseModel):
     username: str
@@ -58,6 +132,37 @@ class SubjectFacultyAssignment(BaseModel):
 class AutomatedTimetableRequest(BaseModel):
     assignments: List[SubjectFacultyAssignment]
 
+# Attendance schemas
+class CheckInRequest(BaseModel):
+    payload: str  # contents of the scanned QR code
+
+class AttendanceSyncRecord(BaseModel):
+    student_id: str
+    schedule_id: str
+    timestamp: datetime  # when the scan happened on the offline device; local time unless it has an offset
+    status: str = "Present"
+    verification_method: str = "QR"
+
+class AttendanceSyncRequest(BaseModel):
+    records: List[AttendanceSyncRecord]
+
+# Plan validation schemas
+class PlanEntry(BaseModel):
+    day_id: int
+    period_id: int
+    subcode: str
+    fini: str
+
+class PlanValidationRequest(BaseModel):
+    section: str
+    entries: List[PlanEntry]
+    replace: bool = True  # the plan replaces the section's current timetable
+
+# Bulk PDF export schema (both lists empty = every section and faculty member)
+class BulkExportRequest(BaseModel):
+    sections: List[str] = []
+    faculty: List[str] = []
+
 # Authentication endpoints
 @app.post("/auth/login", response_model=Token)
 def login(credentials: LoginRequest, db: Session = Depends(get_db)):
@@ -124,17 +229,27 @@ def create_subject(subject: schemas.SubjectsCreate, db: Session = Depends(get_db
     db_subject = models.SUBJECTS(**subject.dict())
     db.add(db_subject)
     db.commit()
+    catalog.invalidate()
     db.refresh(db_subject)
     return db_subject
 
+# Read-only catalog and timetable views run on the async read session (see database.get_async_read_db).
+# List endpoints page by primary key (?after=<X-Next-Cursor>&limit=N; skip still works
+# without a cursor) and stream every row from ?after onwards as NDJSON with ?stream=true.
 @app.get("/subjects/", response_model=List[schemas.Subjects])
-def get_subjects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    subjects = db.query(models.SUBJECTS).offset(skip).limit(limit).all()
+async def get_subjects(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, stream: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    stmt = keyset(select(models.SUBJECTS), models.SUBJECTS.code, after)
+    if stream:
+        return StreamingResponse(stream_ndjson_async(async_read_session(), stmt, model_serializer(schemas.Subjects)), media_type=NDJSON_MEDIA_TYPE)
+    if after is None:
+        stmt = stmt.offset(skip)
+    subjects = (await db.execute(stmt.limit(limit))).scalars().all()
+    set_next_cursor(response, subjects, limit, lambda subject: subject.code)
     return subjects
 
 @app.get("/subjects/{subject_code}", response_model=schemas.Subjects)
-def get_subject(subject_code: str, db: Session = Depends(get_db)):
-    subject = db.query(models.SUBJECTS).filter(models.SUBJECTS.code == subject_code).first()
+async def get_subject(subject_code: str, db: AsyncSession = Depends(get_async_read_db)):
+    subject = (await catalog.get_async(db, subjects=[subject_code])).subject(subject_code)
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     return subject
@@ -149,6 +264,7 @@ def update_subject(subject_code: str, subject: schemas.SubjectsCreate, db: Sessi
         setattr(db_subject, key, value)
     
     db.commit()
+    catalog.invalidate()
     db.refresh(db_subject)
     return db_subject
 
@@ -160,6 +276,7 @@ def delete_subject(subject_code: str, db: Session = Depends(get_db), current_use
     
     db.delete(db_subject)
     db.commit()
+    catalog.invalidate()
     return {"message": "Subject deleted successfully"}
 
 # FACULTY endpoints
@@ -171,17 +288,29 @@ def create_faculty(faculty: schemas.FacultyCreate, db: Session = Depends(get_db)
     db_faculty = models.FACULTY(**faculty_data)
     db.add(db_faculty)
     db.commit()
+    catalog.invalidate()
     db.refresh(db_faculty)
     return db_faculty
 
 @app.get("/faculty/", response_model=List[schemas.Faculty])
-def get_faculty(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    faculty = db.query(models.FACULTY).offset(skip).limit(limit).all()
+async def get_faculty(response: Response, skip: int = 0, limit: int = 100, after: Optional[int] = None, stream: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    stmt = keyset(select(models.FACULTY), models.FACULTY.id, after)
+    if stream:
+        return StreamingResponse(stream_ndjson_async(async_read_session(), stmt, model_serializer(schemas.Faculty)), media_type=NDJSON_MEDIA_TYPE)
+    if after is None:
+        stmt = stmt.offset(skip)
+    faculty = (await db.execute(stmt.limit(limit))).scalars().all()
+    set_next_cursor(response, faculty, limit, lambda member: member.id)
     return faculty
 
+@app.get("/faculty/search", response_model=List[schemas.Faculty])
+def search_faculty(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT), offset: int = Query(0, ge=0), db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    """Faculty whose name, initials or email contain q, best matches first"""
+    return search(db, "faculty", q, limit, offset)
+
 @app.get("/faculty/{faculty_id}", response_model=schemas.Faculty)
-def get_faculty_member(faculty_id: int, db: Session = Depends(get_db)):
-    faculty = db.query(models.FACULTY).filter(models.FACULTY.id == faculty_id).first()
+async def get_faculty_member(faculty_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    faculty = await db.get(models.FACULTY, faculty_id)
     if not faculty:
         raise HTTPException(status_code=404, detail="Faculty not found")
     return faculty
@@ -201,6 +330,7 @@ def update_faculty(faculty_id: int, faculty: schemas.FacultyCreate, db: Session
         setattr(db_faculty, key, value)
     
     db.commit()
+    catalog.invalidate()
     db.refresh(db_faculty)
     return db_faculty
 
@@ -212,6 +342,7 @@ def delete_faculty(faculty_id: int, db: Session = Depends(get_db), current_user:
     
     db.delete(db_faculty)
     db.commit()
+    catalog.invalidate()
     return {"message": "Faculty deleted successfully"}
 
 # STUDENT endpoints
@@ -227,12 +358,23 @@ def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)
     return db_student
 
 @app.get("/students/", response_model=List[schemas.Student])
-def get_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    students = db.query(models.STUDENT).offset(skip).limit(limit).all()
+def get_students(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, stream: bool = False, db: Session = Depends(get_read_db)):
+    stmt = keyset(select(models.STUDENT), models.STUDENT.id, after)
+    if stream:
+        return StreamingResponse(stream_ndjson(read_session(), stmt, model_serializer(schemas.Student)), media_type=NDJSON_MEDIA_TYPE)
+    if after is None:
+        stmt = stmt.offset(skip)
+    students = db.execute(stmt.limit(limit)).scalars().all()
+    set_next_cursor(response, students, limit, lambda student: student.id)
     return students
 
+@app.get("/students/search", response_model=List[schemas.Student])
+def search_students(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT), offset: int = Query(0, ge=0), db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    """Students whose id, name or roll number contain q, best matches first"""
+    return search(db, "students", q, limit, offset)
+
 @app.get("/students/{student_id}", response_model=schemas.Student)
-def get_student(student_id: str, db: Session = Depends(get_db)):
+def get_student(student_id: str, db: Session = Depends(get_read_db)):
     student = db.query(models.STUDENT).filter(models.STUDENT.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -292,30 +434,30 @@ def create_schedule_entry(schedule: schemas.ScheduleCreate, db: Session = Depend
             period_id=schedule.period_id,
             subcode=schedule.subcode,
             section=schedule.section,
-            fini=schedule.fini
+            fini=schedule.fini,
+            entry_id=schedule.id
         )
-        
-        # Set the ID if provided
-        if schedule.id:
-            entry.id = schedule.id
-            db.commit()
-            
         return entry
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/schedule/validate-plan")
+def validate_schedule_plan(request: PlanValidationRequest, db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    """Check a proposed section timetable (credit budgets, slot and teacher collisions) and list every violation"""
+    validator = CreditValidator(db)
+    return validator.validate_plan(request.section, [entry.dict() for entry in request.entries], request.replace)
+
 @app.get("/schedule/", response_model=List[schemas.Schedule])
-def get_all_schedule(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
-    schedule = db.query(models.SCHEDULE).offset(skip).limit(limit).all()
+def get_all_schedule(response: Response, skip: int = 0, limit: int = 1000, after: Optional[str] = None, stream: bool = False, db: Session = Depends(get_read_db)):
+    stmt = keyset(select(models.SCHEDULE), models.SCHEDULE.id, after)
+    if stream:
+        return StreamingResponse(stream_ndjson(read_session(), stmt, model_serializer(schemas.Schedule)), media_type=NDJSON_MEDIA_TYPE)
+    if after is None:
+        stmt = stmt.offset(skip)
+    schedule = db.execute(stmt.limit(limit)).scalars().all()
+    set_next_cursor(response, schedule, limit, lambda entry: entry.id)
     return schedule
 
-@app.get("/schedule/{entry_id}", response_model=schemas.Schedule)
-def get_schedule_entry(entry_id: str, db: Session = Depends(get_db)):
-    entry = db.query(models.SCHEDULE).filter(models.SCHEDULE.id == entry_id).first()
-    if not entry:
-        raise HTTPException(status_code=404, detail="Schedule entry not found")
-    return entry
-
 @app.put("/schedule/{entry_id}", response_model=schemas.Schedule)
 def update_schedule_entry(entry_id: str, schedule: schemas.ScheduleCreate, db: Session = Depends(get_db), current_user: str = Depends(get_current_admin)):
     generator = ScheduleGenerator(db)
@@ -345,9 +487,9 @@ def delete_schedule_entry(entry_id: str, db: Session = Depends(get_db), current_
 
 # Schedule view endpoints
 @app.get("/schedule/section/{section}", response_model=schemas.ScheduleResponse)
-def get_schedule_by_section(section: str, db: Session = Depends(get_db)):
-    generator = ScheduleGenerator(db)
-    schedule = generator.get_schedule_by_section(section)
+async def get_schedule_by_section(section: str, db: AsyncSession = Depends(get_async_read_db)):
+    reader = AsyncScheduleReader(db)
+    schedule = await reader.get_schedule_by_section(section)
     
     return schemas.ScheduleResponse(
         section=section,
@@ -355,13 +497,15 @@ def get_schedule_by_section(section: str, db: Session = Depends(get_db)):
     )
 
 @app.get("/schedule/faculty/{fini}", response_model=schemas.FacultyScheduleResponse)
-def get_schedule_by_faculty(fini: str, db: Session = Depends(get_db)):
-    generator = ScheduleGenerator(db)
-    schedule = generator.get_schedule_by_teacher(fini)
+async def get_schedule_by_faculty(fini: str, db: AsyncSession = Depends(get_async_read_db)):
+    reader = AsyncScheduleReader(db)
+    schedule = await reader.get_schedule_by_teacher(fini)
     
     # Get faculty name
-    faculty = db.query(models.FACULTY).filter(models.FACULTY.initials == fini).first()
-    faculty_name = faculty.name if faculty else "Unknown"
+    faculty_name = await reader.get_teacher_name(fini) or "Unknown"
+    # ScheduleEntry requires teacher_name, which the teacher view leaves out
+    for entry in schedule:
+        entry["teacher_name"] = faculty_name
     
     return schemas.FacultyScheduleResponse(
         faculty_name=faculty_name,
@@ -369,32 +513,115 @@ def get_schedule_by_faculty(fini: str, db: Session = Depends(get_db)):
     )
 
 @app.get("/schedule/full", response_model=List[schemas.ScheduleEntry])
-def get_full_schedule(db: Session = Depends(get_db)):
-    generator = ScheduleGenerator(db)
-    schedule = generator.get_full_schedule()
+async def get_full_schedule(response: Response, after: Optional[str] = None, limit: Optional[int] = None, stream: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    """Every schedule entry with subject and teacher names; optionally paged by id or streamed as NDJSON"""
+    if stream:
+        return StreamingResponse(_stream_full_schedule(after), media_type=NDJSON_MEDIA_TYPE)
+    reader = AsyncScheduleReader(db)
+    schedule = await reader.get_full_schedule(after, limit)
+    set_next_cursor(response, schedule, limit, lambda entry: entry["id"])
     return schedule
 
+async def _stream_full_schedule(after: Optional[str]):
+    db = async_read_session()
+    try:
+        async for entries in AsyncScheduleReader(db).iter_full_schedule(after):
+            yield b"".join(json.dumps(entry).encode() + b"\n" for entry in entries)
+    finally:
+        await db.close()
+
 @app.get("/schedule/conflicts", response_model=List[schemas.Conflict])
-def get_conflicts(db: Session = Depends(get_db)):
+def get_conflicts(db: Session = Depends(get_read_db)):
     generator = ScheduleGenerator(db)
     conflicts = generator.detect_conflicts()
     return conflicts
 
+# Live timetable changes: compact deltas for the given sections and/or faculty
+# (no filter = everything). Events are {"seq", "op": upsert|delete|clear|replace, ...};
+# "resync" means the client fell behind and should refetch.
+@app.get("/schedule/changes")
+async def stream_schedule_changes(section: List[str] = Query([]), faculty: List[str] = Query([])):
+    """Server-sent events feed of schedule changes"""
+    subscription = change_feed.feed.subscribe(section, faculty)
+    return StreamingResponse(
+        change_feed.sse_events(subscription), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/schedule/changes")
+async def websocket_schedule_changes(websocket: WebSocket, section: List[str] = Query([]), faculty: List[str] = Query([])):
+    """The same feed as /schedule/changes over a WebSocket"""
+    await websocket.accept()
+    subscription = change_feed.feed.subscribe(section, faculty)
+    await change_feed.websocket_events(websocket, subscription)
+
+# Schedule history: every SCHEDULE write is logged; the latest change id is the
+# current version. Restores replay from the nearest snapshot and are logged too.
+@app.get("/schedule/history")
+def get_schedule_history(response: Response, after: Optional[int] = None, limit: int = 100, section: Optional[str] = None,
+                         db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    """Logged schedule changes in version order; page with ?after=<last version>"""
+    changes = schedule_history.list_changes(db, after, limit, section)
+    set_next_cursor(response, changes, limit, lambda change: change["version"])
+    return {"current_version": schedule_history.current_version(db), "changes": changes}
+
+@app.get("/schedule/history/snapshots")
+def get_schedule_snapshots(db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    return {"snapshots": schedule_history.list_snapshots(db)}
+
+@app.get("/schedule/history/diff")
+def get_schedule_diff(from_version: int, to_version: Optional[int] = None,
+                      db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    """Entries added, removed and changed between two versions (to_version defaults to the current one)"""
+    if to_version is None:
+        to_version = schedule_history.current_version(db)
+    try:
+        return schedule_history.diff(db, from_version, to_version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/schedule/history/{version}")
+def get_schedule_at_version(version: int, section: Optional[str] = None,
+                            db: Session = Depends(get_read_db), current_user: str = Depends(get_current_admin)):
+    """The timetable as it was at a version"""
+    try:
+        state = schedule_history.state_at(db, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    entries = sorted((row for row in state.values() if not section or row["section"] == section),
+                     key=lambda row: (row["section"], row["day_id"], row["period_id"], row["id"]))
+    return {"version": version, "section": section, "schedule": entries}
+
+@app.post("/schedule/history/{version}/restore")
+def restore_schedule_version(version: int, section: Optional[str] = None,
+                             db: Session = Depends(get_db), current_user: str = Depends(get_current_admin)):
+    """Roll the timetable, or just one section, back to a version"""
+    try:
+        return schedule_history.restore(db, version, section)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Must follow /schedule/full, /schedule/conflicts, /schedule/changes and /schedule/history, which it would otherwise shadow
+@app.get("/schedule/{entry_id}", response_model=schemas.Schedule)
+def get_schedule_entry(entry_id: str, db: Session = Depends(get_read_db)):
+    entry = db.query(models.SCHEDULE).filter(models.SCHEDULE.id == entry_id).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Schedule entry not found")
+    return entry
+
 @app.delete("/schedule/section/{section}")
 def clear_section_schedule(section: str, db: Session = Depends(get_db), current_user: str = Depends(get_current_admin)):
-    deleted_count = db.query(models.SCHEDULE).filter(
-        models.SCHEDULE.section == section
-    ).delete()
-    
-    db.commit()
+    deleted_count = ScheduleGenerator(db).clear_section_schedule(section)
     return {"message": f"Deleted {deleted_count} schedule entries for section {section}"}
 
 # Student and Faculty timetable endpoints
 @app.get("/student/timetable/{section}")
-def get_student_timetable(section: str, db: Session = Depends(get_db)):
+async def get_student_timetable(section: str, db: AsyncSession = Depends(get_async_read_db)):
     """Get timetable for a student's section"""
-    generator = ScheduleGenerator(db)
-    schedule = generator.get_schedule_by_section(section)
+    reader = AsyncScheduleReader(db)
+    schedule = await reader.get_schedule_by_section(section)
     
     return {
         "section": section,
@@ -402,30 +629,201 @@ def get_student_timetable(section: str, db: Session = Depends(get_db)):
     }
 
 @app.get("/faculty/timetable/{fini}")
-def get_faculty_timetable(fini: str, db: Session = Depends(get_db)):
+async def get_faculty_timetable(fini: str, db: AsyncSession = Depends(get_async_read_db)):
     """Get timetable for a faculty member by their initials"""
-    generator = ScheduleGenerator(db)
-    schedule = generator.get_schedule_by_teacher(fini)
+    reader = AsyncScheduleReader(db)
+    schedule = await reader.get_schedule_by_teacher(fini)
     
     return {
         "faculty_initials": fini,
         "schedule": schedule
     }
 
+# PDF export endpoints
+@app.get("/export/section/{section}.pdf")
+def export_section_pdf(section: str, db: Session = Depends(get_read_db)):
+    """Download a section's timetable as PDF"""
+    from pdf_exporter import PDFExporter
+    exporter = PDFExporter(db)
+    pdf = exporter.export_section_timetable(section)
+    
+    return StreamingResponse(
+        io.BytesIO(pdf),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=timetable_section_{section}.pdf"}
+    )
+
+@app.get("/export/faculty/{fini}.pdf")
+def export_faculty_pdf(fini: str, db: Session = Depends(get_read_db)):
+    """Download a faculty member's timetable as PDF"""
+    from pdf_exporter import PDFExporter
+    exporter = PDFExporter(db)
+    
+    try:
+        pdf = exporter.export_faculty_timetable(fini)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return StreamingResponse(
+        io.BytesIO(pdf),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=timetable_faculty_{fini}.pdf"}
+    )
+
+@app.get("/export/summary.pdf")
+def export_summary_pdf(db: Session = Depends(get_read_db)):
+    """Download every section's timetable in one PDF"""
+    from pdf_exporter import PDFExporter
+    exporter = PDFExporter(db)
+    pdf = exporter.export_summary()
+    
+    return StreamingResponse(
+        io.BytesIO(pdf),
+        media_type="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=timetable_summary.pdf"}
+    )
+
+@app.post("/export/bulk.zip")
+def export_bulk_zip(request: BulkExportRequest, db: Session = Depends(get_db), current_user: str = Depends(get_current_admin)):
+    """Render many section and faculty PDFs in parallel and stream them as a ZIP archive"""
+    from pdf_exporter import PDFExporter, stream_bulk_export
+    exporter = PDFExporter(db)
+    
+    try:
+        jobs = exporter.prepare_bulk_jobs(request.sections, request.faculty)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return StreamingResponse(
+        stream_bulk_export(jobs),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=timetables.zip"}
+    )
+
+# Calendar feed endpoints
+def _etag_response(content: bytes, version: str, if_none_match: Optional[str], media_type: str = "text/calendar") -> Response:
+    """Serve a versioned document with an ETag, answering 304 when the client already has this version"""
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=content, media_type=media_type, headers=headers)
+
+@app.get("/calendar/section/{section}.ics")
+def get_section_calendar(section: str, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_read_db)):
+    """Subscribable weekly calendar feed for a section"""
+    exporter = CalendarExporter(db)
+    ics, version = exporter.export_section_calendar(section)
+    return _etag_response(ics, version, if_none_match)
+
+@app.get("/calendar/faculty/{fini}.ics")
+def get_faculty_calendar(fini: str, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_read_db)):
+    """Subscribable weekly calendar feed for a faculty member"""
+    exporter = CalendarExporter(db)
+    
+    try:
+        ics, version = exporter.export_faculty_calendar(fini)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return _etag_response(ics, version, if_none_match)
+
+# Attendance endpoints
+@app.post("/attendance/checkin", status_code=202)
+def attendance_check_in(request: CheckInRequest, db: Session = Depends(get_db), student_id: str = Depends(get_current_student)):
+    """Record a QR check-in for the logged-in student; the row is written in the next batch"""
+    try:
+        return attendance.check_in(db, student_id, request.payload)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/attendance/sync")
+def sync_offline_attendance(request: AttendanceSyncRequest, db: Session = Depends(get_db), current_user: str = Depends(get_current_staff)):
+    """Bulk-upload attendance collected offline; returns an outcome for every record"""
+    if len(request.records) > attendance.ATTENDANCE_SYNC_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {attendance.ATTENDANCE_SYNC_MAX_RECORDS} records per request")
+    
+    results = attendance.sync_records(db, [record.dict() for record in request.records])
+    
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    
+    return {"summary": summary, "results": results}
+
+@app.get("/attendance/student/{student_id}")
+def get_student_attendance(student_id: str, db: Session = Depends(get_db), user: dict = Depends(verify_token_and_get_payload)):
+    """Per-subject attendance for a student (students may only view their own)"""
+    if user["user_type"].lower() == "student" and user["username"] != student_id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    try:
+        return attendance.get_student_attendance(db, student_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/attendance/section/{section}")
+def get_section_attendance(section: str, start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db), current_user: str = Depends(get_current_staff)):
+    """Present counts per class session for a section, optionally within a date range"""
+    return {
+        "section": section,
+        "sessions": attendance.get_section_sessions(db, section, start, end)
+    }
+
+@app.post("/attendance/rollups/rebuild")
+def rebuild_attendance_rollups(db: Session = Depends(get_db), current_user: str = Depends(get_current_admin)):
+    """Recompute the attendance rollup tables from ATTENDANCE"""
+    count = attendance.rebuild_rollups(db)
+    return {"message": f"Rebuilt attendance rollups from {count} records"}
+
+@app.get("/attendance/qr/{schedule_id}.png")
+def get_attendance_qr_image(schedule_id: str, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db), current_user: str = Depends(get_current_staff)):
+    """Current QR code image for a classroom display; rotates every QR_ROTATION_SECONDS"""
+    try:
+        issued = qr_generator.get_qr_png(db, schedule_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    etag = f'"{schedule_id}-{issued["session_date"]}-{issued["window"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={issued['refresh_after']}",
+        "X-QR-Expires-At": str(issued["expires_at"])
+    }
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=issued["png"], media_type="image/png", headers=headers)
+
+@app.get("/attendance/qr/{schedule_id}")
+def get_attendance_qr_payload(schedule_id: str, db: Session = Depends(get_db), current_user: str = Depends(get_current_staff)):
+    """Current signed QR payload for today's session of a class"""
+    try:
+        return qr_generator.issue_qr_payload(db, schedule_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Automated Timetable Generation endpoints
+# Served from the catalog registry's pre-serialized bodies
 @app.get("/automated/subjects")
-def get_available_subjects(db: Session = Depends(get_db)):
+def get_available_subjects(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_read_db)):
     """Get all available subjects for automated timetable generation"""
-    generator = AutomatedTimetableGenerator(db)
-    subjects = generator.get_available_subjects()
-    return {"subjects": subjects}
+    known = catalog.get(db)
+    return _etag_response(known.subjects_json, known.version, if_none_match, "application/json")
 
 @app.get("/automated/faculty")
-def get_available_faculty(db: Session = Depends(get_db)):
+def get_available_faculty(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_read_db)):
     """Get all available faculty for automated timetable generation"""
-    generator = AutomatedTimetableGenerator(db)
-    faculty = generator.get_available_faculty()
-    return {"faculty": faculty}
+    known = catalog.get(db)
+    return _etag_response(known.faculty_json, known.version, if_none_match, "application/json")
 
 @app.post("/automated/generate")
 def generate_automated_timetable(request: AutomatedTimetableRequest, db: Session = Depends(get_db), current_user: str = Depends(get_current_admin)):
@@ -440,6 +838,7 @@ def generate_automated_timetable(request: AutomatedTimetableRequest, db: Session
         subject_faculty_assignments[section][assignment.subject_code] = assignment.faculty_initials
     
     # Generate timetable
+    from automated_timetable_generator import AutomatedTimetableGenerator
     generator = AutomatedTimetableGenerator(db)
     results = generator.generate_automated_timetable(subject_faculty_assignments)
     
@@ -449,7 +848,7 @@ def generate_automated_timetable(request: AutomatedTimetableRequest, db: Session
     }
 
 @app.get("/automated/preview/{section}")
-def preview_section_timetable(section: str, db: Session = Depends(get_db)):
+def preview_section_timetable(section: str, db: Session = Depends(get_read_db)):
     """Preview the generated timetable for a specific section"""
     generator = ScheduleGenerator(db)
     schedule = generator.get_schedule_by_section(section)
@@ -0,0 +1,143 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("timetable.metrics")
+
+# Requests running more SQL statements than this are logged as likely N+1 patterns
+METRICS_QUERY_WARN_THRESHOLD = int(os.getenv("METRICS_QUERY_WARN_THRESHOLD", "50"))
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+# Statement counter for the request being handled; a one-element list so that
+# threadpool workers (which run in a copy of the context) update the same counter
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: List[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            label_text = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"), LATENCY_BUCKETS
+)
+response_size = Histogram(
+    "http_response_size_bytes", "Response body size by route", ("method", "route"), SIZE_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request", ("method", "route"), QUERY_BUCKETS
+)
+
+_statements_total = 0
+_statements_lock = threading.Lock()
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global _statements_total
+    with _statements_lock:
+        _statements_total += 1
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+def instrument_engine(engine: Engine):
+    """Count every SQL statement run through the engine"""
+    if not event.contains(engine, "before_cursor_execute", _count_statement):
+        event.listen(engine, "before_cursor_execute", _count_statement)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, response size and SQL statement count per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _request_queries.set(counter)
+        start = time.perf_counter()
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            # Use the route template so /schedule/section/A and /schedule/section/B share a series
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+
+            request_latency.observe((method, route_path, str(state["status"])), elapsed)
+            response_size.observe((method, route_path), state["size"])
+            request_queries.observe((method, route_path), counter[0])
+
+            if counter[0] > METRICS_QUERY_WARN_THRESHOLD:
+                logger.warning(
+                    "%s %s ran %d SQL statements (threshold %d) in %.1f ms",
+                    method, scope.get("path"), counter[0], METRICS_QUERY_WARN_THRESHOLD, elapsed * 1000
+                )
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for histogram in (request_latency, response_size, request_queries):
+        lines.extend(histogram.render())
+    lines.append("# HELP db_statements_total SQL statements executed by this process")
+    lines.append("# TYPE db_statements_total counter")
+    lines.append(f"db_statements_total {_statements_total}")
+    return "\n".join(lines) + "\n"
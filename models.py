@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String,Float ,ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String,Float ,ForeignKey, DateTime, Date, Boolean, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -48,6 +48,33 @@ class SCHEDULE(Base):
     
     subject = relationship("SUBJECTS", back_populates="timetables")
     teacher = relationship("FACULTY", back_populates="timetables")
+    
+    __table_args__ = (
+        Index("ix_schedule_slot", "day_id", "period_id"),  # conflict checks
+        Index("ix_schedule_section", "section"),
+        Index("ix_schedule_fini", "fini"),
+    )
+
+class SCHEDULE_CHANGE(Base):
+    """Append-only log of SCHEDULE row changes; the id is the schedule version"""
+    __tablename__ = "SCHEDULE_CHANGE"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    op = Column(String)  # insert / update / delete
+    entry_id = Column(String, index=True)
+    section = Column(String)  # section after the change (before, for deletes)
+    before = Column(Text)  # JSON row image, NULL for inserts
+    after = Column(Text)  # JSON row image, NULL for deletes
+
+class SCHEDULE_SNAPSHOT(Base):
+    """Whole SCHEDULE table as of a version, zlib-compressed JSON rows"""
+    __tablename__ = "SCHEDULE_SNAPSHOT"
+    
+    version = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    entry_count = Column(Integer)
+    data = Column(LargeBinary)
 
 class ATTENDANCE(Base):
     __tablename__ = "ATTENDANCE"
@@ -60,7 +87,30 @@ class ATTENDANCE(Base):
     qr_code_hash = Column(String, unique=True, index=True)
     verification_method = Column(String, default="QR")  # QR, Manual, Biometric
     created_at = Column(DateTime, default=datetime.utcnow)
+    session_date = Column(Date)  # class date from the QR payload (local), which the rollups key on
     
     # Relationships
     student = relationship("STUDENT")
     schedule = relationship("SCHEDULE")
+
+# Attendance rollups, maintained incrementally as ATTENDANCE rows are written
+class ATTENDANCE_STUDENT_ROLLUP(Base):
+    __tablename__ = "ATTENDANCE_STUDENT_ROLLUP"
+    
+    student_id = Column(String, ForeignKey("STUDENT.id"), primary_key=True)
+    subcode = Column(String, ForeignKey("SUBJECTS.code"), primary_key=True)
+    present_count = Column(Integer, default=0)
+    last_seen = Column(DateTime)
+
+class ATTENDANCE_SESSION_ROLLUP(Base):
+    __tablename__ = "ATTENDANCE_SESSION_ROLLUP"
+    
+    section = Column(String, primary_key=True)
+    schedule_id = Column(String, ForeignKey("SCHEDULE.id"), primary_key=True)
+    session_date = Column(Date, primary_key=True)
+    subcode = Column(String, ForeignKey("SUBJECTS.code"))
+    present_count = Column(Integer, default=0)
+    
+    __table_args__ = (
+        Index("ix_attendance_session_rollup_section_subcode", "section", "subcode"),
+    )
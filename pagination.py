@@ -0,0 +1,49 @@
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+import os
+
+# List endpoints page by primary key: ?after=<last key of the previous page>&limit=N.
+# A full page carries the cursor for the next one in this header.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Rows fetched per round trip when streaming NDJSON
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+def keyset(stmt, key_column, after=None, limit: Optional[int] = None):
+    """Restrict a select to the rows after a cursor, in key order"""
+    if after is not None:
+        stmt = stmt.where(key_column > after)
+    stmt = stmt.order_by(key_column)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def set_next_cursor(response, rows: List, limit: Optional[int], key: Callable):
+    """Advertise the next cursor when the page came back full"""
+    if limit and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(key(rows[-1]))
+
+def stream_ndjson(db, stmt, serialize: Callable) -> Iterator[bytes]:
+    """
+    Yield one JSON document per row from a server-side cursor, a batch at a
+    time, so memory stays flat however large the table. Closes the session.
+    """
+    try:
+        result = db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for rows in result.scalars().partitions():
+            yield b"".join(serialize(row) + b"\n" for row in rows)
+    finally:
+        db.close()
+
+async def stream_ndjson_async(db, stmt, serialize: Callable) -> AsyncIterator[bytes]:
+    """stream_ndjson for an AsyncSession"""
+    try:
+        result = await db.stream_scalars(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield b"".join(serialize(row) + b"\n" for row in rows)
+    finally:
+        await db.close()
+
+def model_serializer(schema) -> Callable:
+    """Serialize ORM rows through a response schema, as the JSON endpoints do"""
+    return lambda row: schema.model_validate(row).model_dump_json().encode()
@@ -4,128 +4,238 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from sqlalchemy.orm import Session
-from models import Class, Teacher, Timetable, TimeSlot
-from timetable_generator import TimetableGenerator
-from typing import List
+from catalog import catalog
+from schedule_generator import ScheduleGenerator, schedule_version
+from render_cache import VersionedCache
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 import io
+import os
+import zipfile
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Worker processes used by bulk export
+BULK_EXPORT_WORKERS = int(os.getenv("BULK_EXPORT_WORKERS", str(os.cpu_count() or 2)))
+
+# Rendered PDFs keyed by (kind, key), valid for one schedule version
+PDF_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", "256"))
+pdf_cache = VersionedCache(PDF_CACHE_MAX_ENTRIES)
+
+def clear_pdf_cache():
+    """Drop all cached PDFs"""
+    pdf_cache.clear()
+
+def _section_cell(entry: Dict) -> str:
+    return f"{entry['subject_name']}\n{entry['subcode']}\n{entry['fini']}"
+
+def _faculty_cell(entry: Dict) -> str:
+    return f"Section {entry['section']}\n{entry['subject_name']}\n{entry['subcode']}"
+
+# Cell text for each timetable kind
+CELL_FORMATTERS = {
+    "section": _section_cell,
+    "faculty": _faculty_cell,
+}
+
+def build_grid_index(schedule: List[Dict]) -> Tuple[Dict[Tuple[int, int], Dict], List[int], List[int]]:
+    """Index schedule entries by (day_id, period_id) and collect the days and periods in use"""
+    grid = {}
+    for entry in schedule:
+        # Keep the first entry for a slot, matching the old linear search
+        grid.setdefault((entry['day_id'], entry['period_id']), entry)
+
+    days = sorted(day for day in set(day for day, _ in grid) if 1 <= day <= len(DAY_NAMES))
+    periods = sorted(set(period for _, period in grid))
+    return grid, days, periods
+
+def render_timetable_pdf(title: str, schedule: List[Dict], kind: str) -> bytes:
+    """Render a day/period timetable grid as PDF.
+
+    Takes plain schedule dicts and no DB session so it can run in worker processes.
+    """
+    styles = getSampleStyleSheet()
+    cell_content = CELL_FORMATTERS[kind]
+
+    # Create PDF buffer
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    story = []
+
+    # Title
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    )
+    story.append(Paragraph(title, title_style))
+    story.append(Spacer(1, 12))
+
+    # Index the schedule once so table construction only walks the grid
+    grid, days, periods = build_grid_index(schedule)
+
+    # Create table data
+    table_data = [["Period/Day"] + [DAY_NAMES[day - 1] for day in days]]
+
+    for period in periods:
+        row = [f"Period {period}"]
+
+        for day in days:
+            entry = grid.get((day, period))
+            row.append(cell_content(entry) if entry else "")
+
+        table_data.append(row)
+
+    # Create table
+    if len(table_data) > 1:
+        table = Table(table_data, repeatRows=1)
+
+        # Style the table
+        table.setStyle(TableStyle([
+            # Header styling
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+
+            # Cell styling
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+        ]))
+
+        story.append(table)
+    else:
+        story.append(Paragraph("No timetable data available.", styles['Normal']))
+
+    # Build PDF
+    doc.build(story)
+    buffer.seek(0)
+
+    return buffer.getvalue()
 
 class PDFExporter:
     def __init__(self, db: Session):
         self.db = db
         self.styles = getSampleStyleSheet()
-        self.generator = TimetableGenerator(db)
-        
-    def export_class_timetable(self, class_id: int) -> bytes:
-        """Export class timetable as PDF"""
-        
-        # Get class information
-        class_obj = self.db.query(Class).filter(Class.id == class_id).first()
-        if not class_obj:
-            raise ValueError(f"Class with id {class_id} not found")
-        
+        self.generator = ScheduleGenerator(db)
+
+    def export_section_timetable(self, section: str) -> bytes:
+        """Export section timetable as PDF"""
+
         # Get schedule
-        schedule = self.generator.get_class_schedule(class_id)
-        
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        story = []
-        
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
-        story.append(Paragraph(f"Class Timetable - {class_obj.name}", title_style))
-        story.append(Spacer(1, 12))
-        
-        # Create timetable grid
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        periods = sorted(list(set(entry['period'] for entry in schedule)))
-        
-        # Get time slots for period headers
-        time_slots = {}
-        for entry in schedule:
-            period = entry['period']
-            if period not in time_slots:
-                time_slot = self.db.query(TimeSlot).filter(
-                    TimeSlot.period_number == period
-                ).first()
-                if time_slot:
-                    time_slots[period] = f"{time_slot.start_time} - {time_slot.end_time}"
-        
-        # Create table data
-        table_data = [["Period/Day"] + [day for day in days if any(entry['day'] == days.index(day) for entry in schedule)]]
-        
-        for period in sorted(periods):
-            row = [f"{period}<br/>{time_slots.get(period, '')}"]
-            
-            for day_idx, day in enumerate(days):
-                if not any(entry['day'] == day_idx for entry in schedule):
-                    continue
-                    
-                # Find entry for this day and period
-                entry = next((e for e in schedule if e['day'] == day_idx and e['period'] == period), None)
-                
-                if entry:
-                    cell_content = f"{entry['subject']}<br/>{entry['teacher']}<br/>{entry['room']}"
-                else:
-                    cell_content = ""
-                
-                row.append(cell_content)
-            
-            table_data.append(row)
-        
-        # Create table
-        if len(table_data) > 1:
-            table = Table(table_data, repeatRows=1)
-            
-            # Style the table
-            table.setStyle(TableStyle([
-                # Header styling
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                
-                # Cell styling
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ]))
-            
-            story.append(table)
-        else:
-            story.append(Paragraph("No timetable data available.", self.styles['Normal']))
-        
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
-        
-        return buffer.getvalue()
-    
-    def export_teacher_timetable(self, teacher_id: int) -> bytes:
-        """Export teacher timetable as PDF"""
-        
-        # Get teacher information
-        teacher = self.db.query(Teacher).filter(Teacher.id == teacher_id).first()
-        if not teacher:
-            raise ValueError(f"Teacher with id {teacher_id} not found")
-        
+        schedule = self.generator.get_schedule_by_section(section)
+
+        # Serve the cached render if the timetable has not changed
+        cache_key = ("section", section)
+        version = schedule_version(schedule)
+        pdf = pdf_cache.get(cache_key, version)
+        if pdf is not None:
+            return pdf
+
+        pdf = render_timetable_pdf(f"Section Timetable - {section}", schedule, "section")
+        pdf_cache.put(cache_key, version, pdf)
+
+        return pdf
+
+    def export_faculty_timetable(self, fini: str) -> bytes:
+        """Export faculty timetable as PDF"""
+
+        # Get faculty information
+        faculty = catalog.get(self.db, faculty=[fini]).faculty(fini)
+        if not faculty:
+            raise ValueError(f"Faculty with initials {fini} not found")
+
         # Get schedule
-        schedule = self.generator.get_teacher_schedule(teacher_id)
-        
+        schedule = self.generator.get_schedule_by_teacher(fini)
+
+        # Serve the cached render if the timetable has not changed
+        cache_key = ("faculty", fini)
+        version = schedule_version(schedule + [{"faculty_name": faculty['name']}])
+        pdf = pdf_cache.get(cache_key, version)
+        if pdf is not None:
+            return pdf
+
+        pdf = render_timetable_pdf(f"Faculty Timetable - {faculty['name']} ({fini})", schedule, "faculty")
+        pdf_cache.put(cache_key, version, pdf)
+
+        return pdf
+
+    def prepare_bulk_jobs(self, sections: Optional[List[str]] = None, faculty: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Collect render jobs for a bulk export with one schedule query; names come from the catalog registry.
+        Empty or missing lists mean every section / every faculty member.
+        """
+
+        full_schedule = self.generator.get_full_schedule()
+        faculty_names = catalog.get(self.db).teacher_names
+
+        if not sections and not faculty:
+            sections = sorted(set(entry['section'] for entry in full_schedule))
+            faculty = sorted(faculty_names.keys())
+
+        for fini in faculty or []:
+            if fini not in faculty_names:
+                raise ValueError(f"Faculty with initials {fini} not found")
+
+        by_section = {}
+        by_faculty = {}
+        for entry in full_schedule:
+            by_section.setdefault(entry['section'], []).append(entry)
+            # Faculty timetables carry the same fields as get_schedule_by_teacher so cache versions match
+            by_faculty.setdefault(entry['fini'], []).append(
+                {key: value for key, value in entry.items() if key != 'teacher_name'}
+            )
+
+        jobs = []
+        for section in sections or []:
+            schedule = by_section.get(section, [])
+            jobs.append({
+                "filename": f"sections/timetable_section_{section}.pdf",
+                "cache_key": ("section", section),
+                "version": schedule_version(schedule),
+                "title": f"Section Timetable - {section}",
+                "schedule": schedule,
+                "kind": "section"
+            })
+
+        for fini in faculty or []:
+            schedule = by_faculty.get(fini, [])
+            name = faculty_names[fini]
+            jobs.append({
+                "filename": f"faculty/timetable_faculty_{fini}.pdf",
+                "cache_key": ("faculty", fini),
+                "version": schedule_version(schedule + [{"faculty_name": name}]),
+                "title": f"Faculty Timetable - {name} ({fini})",
+                "schedule": schedule,
+                "kind": "faculty"
+            })
+
+        return jobs
+
+    def export_summary(self) -> bytes:
+        """Export summary of all section timetables as PDF"""
+
+        schedule = self.generator.get_full_schedule()
+
+        # Serve the cached render if the timetable has not changed
+        cache_key = ("summary", "")
+        version = schedule_version(schedule)
+        pdf = pdf_cache.get(cache_key, version)
+        if pdf is not None:
+            return pdf
+
         # Create PDF buffer
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
-        
+
         # Title
         title_style = ParagraphStyle(
             'CustomTitle',
@@ -134,146 +244,124 @@ class PDFExporter:
             spaceAfter=30,
             alignment=1  # Center alignment
         )
-        story.append(Paragraph(f"Teacher Timetable - {teacher.name}", title_style))
+        story.append(Paragraph("Timetable Summary", title_style))
         story.append(Spacer(1, 12))
-        
-        # Create timetable grid
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        periods = sorted(list(set(entry['period'] for entry in schedule)))
-        
-        # Get time slots for period headers
-        time_slots = {}
+
+        # Group entries by section in one pass
+        by_section = {}
         for entry in schedule:
-            period = entry['period']
-            if period not in time_slots:
-                time_slot = self.db.query(TimeSlot).filter(
-                    TimeSlot.period_number == period
-                ).first()
-                if time_slot:
-                    time_slots[period] = f"{time_slot.start_time} - {time_slot.end_time}"
-        
-        # Create table data
-        table_data = [["Period/Day"] + [day for day in days if any(entry['day'] == days.index(day) for entry in schedule)]]
-        
-        for period in sorted(periods):
-            row = [f"{period}<br/>{time_slots.get(period, '')}"]
-            
-            for day_idx, day in enumerate(days):
-                if not any(entry['day'] == day_idx for entry in schedule):
-                    continue
-                    
-                # Find entry for this day and period
-                entry = next((e for e in schedule if e['day'] == day_idx and e['period'] == period), None)
-                
-                if entry:
-                    cell_content = f"{entry['class']}<br/>{entry['subject']}<br/>{entry['room']}"
-                else:
-                    cell_content = ""
-                
-                row.append(cell_content)
-            
-            table_data.append(row)
-        
-        # Create table
-        if len(table_data) > 1:
+            by_section.setdefault(entry['section'], []).append(entry)
+        sections = sorted(by_section)
+
+        for section in sections:
+            # Section title
+            section_title = ParagraphStyle(
+                'SectionTitle',
+                parent=self.styles['Heading2'],
+                fontSize=14,
+                spaceAfter=12
+            )
+            story.append(Paragraph(f"Section: {section}", section_title))
+
+            # Get section schedule
+            section_schedule = sorted(by_section[section], key=lambda e: (e['day_id'], e['period_id']))
+
+            # Create simple table for this section
+            table_data = [["Day", "Period", "Subject", "Teacher"]]
+
+            for entry in section_schedule:
+                day_name = DAY_NAMES[entry['day_id'] - 1] if 1 <= entry['day_id'] <= len(DAY_NAMES) else str(entry['day_id'])
+                table_data.append([
+                    day_name,
+                    str(entry['period_id']),
+                    f"{entry['subject_name']} ({entry['subcode']})",
+                    f"{entry['teacher_name']} ({entry['fini']})"
+                ])
+
             table = Table(table_data, repeatRows=1)
-            
-            # Style the table
             table.setStyle(TableStyle([
-                # Header styling
                 ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
                 ('FONTSIZE', (0, 0), (-1, 0), 10),
-                
-                # Cell styling
                 ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
                 ('FONTSIZE', (0, 1), (-1, -1), 8),
                 ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
             ]))
-            
+
             story.append(table)
-        else:
+            story.append(Spacer(1, 20))
+
+        if not sections:
             story.append(Paragraph("No timetable data available.", self.styles['Normal']))
-        
+
         # Build PDF
         doc.build(story)
         buffer.seek(0)
-        
-        return buffer.getvalue()
-    
-    def export_summary(self) -> bytes:
-        """Export summary of all timetables as PDF"""
-        
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        story = []
-        
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
-        story.append(Paragraph("Timetable Summary", title_style))
-        story.append(Spacer(1, 12))
-        
-        # Get all classes
-        classes = self.db.query(Class).all()
-        
-        for class_obj in classes:
-            # Class title
-            class_title = ParagraphStyle(
-                'ClassTitle',
-                parent=self.styles['Heading2'],
-                fontSize=14,
-                spaceAfter=12
-            )
-            story.append(Paragraph(f"Class: {class_obj.name}", class_title))
-            
-            # Get class schedule
-            schedule = self.generator.get_class_schedule(class_obj.id)
-            
-            if schedule:
-                # Create simple table for this class
-                table_data = [["Day", "Period", "Subject", "Teacher", "Room"]]
-                
-                for entry in schedule:
-                    day_name = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][entry['day']]
-                    table_data.append([
-                        day_name,
-                        f"{entry['period']} ({entry['start_time']}-{entry['end_time']})",
-                        entry['subject'],
-                        entry['teacher'],
-                        entry['room']
-                    ])
-                
-                table = Table(table_data, repeatRows=1)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                
-                story.append(table)
+
+        pdf = buffer.getvalue()
+        pdf_cache.put(cache_key, version, pdf)
+
+        return pdf
+
+class _ZipStream:
+    """Write-only file object that hands out whatever zipfile has written so far"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_bulk_export(jobs: List[Dict], max_workers: int = None) -> Iterator[bytes]:
+    """
+    Render bulk export jobs across a process pool and yield a ZIP archive incrementally.
+
+    At most max_workers documents are rendering or waiting to be written at any time,
+    so memory stays bounded by the pool size rather than the number of documents.
+    Cached renders are reused and fresh renders are added to the cache.
+    """
+    max_workers = max(1, max_workers or BULK_EXPORT_WORKERS)
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED)
+    pending = deque()
+
+    def write_oldest() -> bytes:
+        # Entries are written in job order so the archive layout is deterministic
+        job, future, pdf = pending.popleft()
+        if future is not None:
+            pdf = future.result()
+            pdf_cache.put(job["cache_key"], job["version"], pdf)
+        archive.writestr(job["filename"], pdf)
+        return stream.drain()
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        for job in jobs:
+            cached = pdf_cache.get(job["cache_key"], job["version"])
+            if cached is not None:
+                pending.append((job, None, cached))
             else:
-                story.append(Paragraph("No timetable data available.", self.styles['Normal']))
-            
-            story.append(Spacer(1, 20))
-        
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
-        
-        return buffer.getvalue()
+                future = executor.submit(render_timetable_pdf, job["title"], job["schedule"], job["kind"])
+                pending.append((job, future, None))
+
+            if len(pending) >= max_workers:
+                yield write_oldest()
+
+        while pending:
+            yield write_oldest()
+
+        archive.close()
+        yield stream.drain()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
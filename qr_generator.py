@@ -0,0 +1,72 @@
+from sqlalchemy.orm import Session
+from attendance import sign_qr_payload, slot_index
+from render_cache import ExpiringCache
+from datetime import datetime
+from typing import Dict, Optional
+import io
+import os
+
+# A new QR payload is issued every rotation window; scans are accepted for a
+# short grace period after the window closes so a student mid-scan isn't rejected
+QR_ROTATION_SECONDS = int(os.getenv("QR_ROTATION_SECONDS", "30"))
+QR_GRACE_SECONDS = int(os.getenv("QR_GRACE_SECONDS", "15"))
+
+# Rendered PNGs keyed by (schedule_id, session date, window), dropped when the window ends
+QR_CACHE_MAX_ENTRIES = int(os.getenv("QR_CACHE_MAX_ENTRIES", "512"))
+qr_image_cache = ExpiringCache(QR_CACHE_MAX_ENTRIES)
+
+def issue_qr_payload(db: Session, schedule_id: str, now: Optional[datetime] = None) -> Dict:
+    """
+    Issue the signed QR payload for today's session of a schedule slot.
+
+    Every caller within the same rotation window gets the same payload, so
+    classroom displays polling the endpoint share one render.
+    """
+    now = now or datetime.now()
+
+    slot = slot_index.get_slot(db, schedule_id)
+    if slot is None:
+        raise LookupError(f"Schedule entry with id {schedule_id} not found")
+    if slot["day_id"] != now.isoweekday():
+        raise ValueError(f"Schedule entry {schedule_id} does not meet today")
+
+    timestamp = int(now.timestamp())
+    window = timestamp // QR_ROTATION_SECONDS
+    window_ends_at = (window + 1) * QR_ROTATION_SECONDS
+    session_date = now.date()
+
+    return {
+        "schedule_id": schedule_id,
+        "session_date": session_date.isoformat(),
+        "window": window,
+        "payload": sign_qr_payload(schedule_id, session_date, window_ends_at + QR_GRACE_SECONDS),
+        "expires_at": window_ends_at + QR_GRACE_SECONDS,
+        "refresh_after": window_ends_at - timestamp
+    }
+
+def render_qr_png(payload: str) -> bytes:
+    """Render a QR payload as PNG bytes"""
+    import qrcode  # imported on first use; pulls in Pillow
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def get_qr_png(db: Session, schedule_id: str, now: Optional[datetime] = None) -> Dict:
+    """Return the issued payload plus its PNG, rendering at most once per slot per window"""
+    now = now or datetime.now()
+    issued = issue_qr_payload(db, schedule_id, now)
+
+    cache_key = (schedule_id, issued["session_date"], issued["window"])
+    png = qr_image_cache.get(cache_key, now.timestamp())
+    if png is None:
+        png = render_qr_png(issued["payload"])
+        # The image is only displayed until the window rotates
+        qr_image_cache.put(cache_key, now.timestamp() + issued["refresh_after"], png, now.timestamp())
+
+    issued["png"] = png
+    return issued
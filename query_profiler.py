@@ -0,0 +1,164 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import deque
+from typing import Dict, List, Optional
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("timetable.queries")
+
+# Statements slower than this are logged and get their plan captured
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Durations kept per fingerprint for percentile estimates
+PROFILE_SAMPLES = int(os.getenv("QUERY_PROFILE_SAMPLES", "512"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?|:\w+|\$\d+")
+_PLACEHOLDER_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement so executions differing only in values group together"""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    # IN lists of any length collapse to one shape
+    sql = _PLACEHOLDER_LIST.sub("IN (?+)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+class QueryStats:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=PROFILE_SAMPLES)
+        self.slow_count = 0
+        self.plan: Optional[List[str]] = None
+        self.plan_ms: Optional[float] = None
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_dict(self) -> Dict:
+        return {
+            "fingerprint": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "max_ms": round(self.max_ms, 3),
+            "slow_count": self.slow_count,
+            "plan": self.plan,
+            "plan_captured_at_ms": self.plan_ms
+        }
+
+class QueryProfiler:
+    """Times every statement on one or more engines and aggregates by fingerprint"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+        self.engines: List[Engine] = []
+
+    def install(self, engine: Engine):
+        if engine in self.engines:
+            return
+        self.engines.append(engine)
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def uninstall(self):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._before)
+            event.remove(engine, "after_cursor_execute", self._after)
+        self.engines = []
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        sql = fingerprint(statement)
+
+        with self._lock:
+            stats = self.stats.get(sql)
+            if stats is None:
+                stats = self.stats[sql] = QueryStats(sql)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.samples.append(elapsed_ms)
+            slow = elapsed_ms >= self.slow_query_ms
+            if slow:
+                stats.slow_count += 1
+            # Capture the plan on the first slow run and whenever a run sets a new maximum
+            capture = slow and not executemany and (stats.plan is None or elapsed_ms >= stats.max_ms)
+
+        if slow:
+            logger.warning("Slow query (%.1f ms): %s", elapsed_ms, sql)
+        if capture:
+            plan = self._explain(conn, cursor, statement, parameters)
+            if plan is not None:
+                with self._lock:
+                    stats.plan = plan
+                    stats.plan_ms = round(elapsed_ms, 3)
+
+    def _explain(self, conn, cursor, statement: str, parameters) -> Optional[List[str]]:
+        """Run EXPLAIN on the raw DBAPI connection so it isn't itself profiled or counted"""
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        elif dialect == "postgresql":
+            prefix = "EXPLAIN "
+        else:
+            return None
+
+        try:
+            raw_cursor = cursor.connection.cursor()
+            try:
+                raw_cursor.execute(prefix + statement, parameters)
+                rows = raw_cursor.fetchall()
+            finally:
+                raw_cursor.close()
+        except Exception as e:
+            return [f"EXPLAIN failed: {e}"]
+
+        if dialect == "sqlite":
+            # (id, parent, notused, detail)
+            return [str(row[-1]) for row in rows]
+        return [str(row[0]) for row in rows]
+
+    def report(self, limit: int = 50, order_by: str = "total_ms") -> Dict:
+        with self._lock:
+            entries = [stats.to_dict() for stats in self.stats.values()]
+        entries.sort(key=lambda entry: entry.get(order_by, 0) or 0, reverse=True)
+        return {
+            "enabled": bool(self.engines),
+            "slow_query_ms": self.slow_query_ms,
+            "fingerprints": len(entries),
+            "queries": entries[:limit]
+        }
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+profiler = QueryProfiler()
+
+def enable_query_profiling(engine: Engine):
+    profiler.install(engine)
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+import threading
+
+class VersionedCache:
+    """
+    Thread-safe LRU cache of rendered documents.
+
+    Each key holds a single (version, payload) pair; a lookup only hits when the
+    stored version matches, so a changed timetable simply misses and overwrites.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: str) -> Optional[bytes]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return cached[1]
+
+    def put(self, key: Hashable, version: str, payload: bytes):
+        with self._lock:
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ExpiringCache:
+    """
+    Thread-safe cache whose entries carry their own expiry time.
+
+    Expired entries are dropped on access and swept on every insert; the least
+    recently used entry is evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, now: float) -> Optional[bytes]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                return None
+            if cached[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return cached[1]
+
+    def put(self, key: Hashable, expires_at: float, payload: bytes, now: float):
+        with self._lock:
+            for expired in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+                del self._entries[expired]
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,59 +1,79 @@
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
-from models import SUBJECTS, FACULTY, SCHEDULE
-from typing import List, Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import SCHEDULE
+from catalog import catalog
+from change_feed import entry_delta, record_change
+from schedule_history import log_changes
+from pagination import keyset, STREAM_BATCH_SIZE
+from typing import AsyncIterator, List, Dict, Optional
+import hashlib
 import uuid
 
+def schedule_version(schedule: List[Dict]) -> str:
+    """Content hash of a formatted schedule, independent of row order"""
+    digest = hashlib.sha1()
+    for entry in sorted(schedule, key=lambda e: (e.get("day_id") or 0, e.get("period_id") or 0, e.get("id") or "")):
+        digest.update(repr(sorted(entry.items())).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def format_entry(entry: SCHEDULE, subject_names: Dict[str, str], teacher_names: Optional[Dict[str, str]] = None) -> Dict:
+    """Schedule row as returned by the timetable views; teacher_name is omitted for a teacher's own view"""
+    formatted = {
+        "id": entry.id,
+        "day_id": entry.day_id,
+        "period_id": entry.period_id,
+        "subcode": entry.subcode,
+        "subject_name": subject_names.get(entry.subcode, "Unknown"),
+        "section": entry.section,
+        "fini": entry.fini
+    }
+    if teacher_names is not None:
+        formatted["teacher_name"] = teacher_names.get(entry.fini, "Unknown")
+    return formatted
+
 class ScheduleGenerator:
     def __init__(self, db: Session):
         self.db = db
-        
-    def create_schedule_entry(self, day_id: int, period_id: int, subcode: str, section: str, fini: str) -> SCHEDULE:
-        """Create a single schedule entry"""
-        
-        # Verify subject exists
-        subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
-        if not subject:
-            raise ValueError(f"Subject with code {subcode} not found")
-        
-        # Verify teacher exists
-        teacher = self.db.query(FACULTY).filter(FACULTY.initials == fini).first()
-        if not teacher:
-            raise ValueError(f"Teacher with initials {fini} not found")
-        
-        # Check for conflicts
-        existing = self.db.query(SCHEDULE).filter(
+    
+    def _check_slot_conflicts(self, day_id: int, period_id: int, section: str, fini: str, exclude_id: Optional[str] = None):
+        """
+        Raise ValueError if the section or the teacher is already busy in the slot.
+        One query on ix_schedule_slot returns every colliding row; a teacher clash
+        covers teaching the same subject in another section at the same time.
+        """
+        criteria = [
             SCHEDULE.day_id == day_id,
             SCHEDULE.period_id == period_id,
-            SCHEDULE.section == section
-        ).first()
+            or_(SCHEDULE.section == section, SCHEDULE.fini == fini),
+        ]
+        if exclude_id is not None:
+            criteria.append(SCHEDULE.id != exclude_id)
+        colliding = self.db.query(SCHEDULE.section, SCHEDULE.fini, SCHEDULE.subcode).filter(*criteria).all()
         
-        if existing:
+        if any(row.section == section for row in colliding):
             raise ValueError(f"Schedule conflict: Section {section} already has a class at day {day_id}, period {period_id}")
+        for row in colliding:
+            if row.fini == fini:
+                raise ValueError(f"Teacher {fini} already has a class at day {day_id}, period {period_id} in section {row.section} ({row.subcode})")
         
-        # Check teacher availability (any class at same time)
-        teacher_conflict = self.db.query(SCHEDULE).filter(
-            SCHEDULE.day_id == day_id,
-            SCHEDULE.period_id == period_id,
-            SCHEDULE.fini == fini
-        ).first()
+    def create_schedule_entry(self, day_id: int, period_id: int, subcode: str, section: str, fini: str,
+                              entry_id: Optional[str] = None) -> SCHEDULE:
+        """Create a single schedule entry (with a generated id unless one is given)"""
         
-        if teacher_conflict:
-            raise ValueError(f"Teacher {fini} already has a class at day {day_id}, period {period_id}")
+        # Verify subject and teacher exist
+        known = catalog.get(self.db, subjects=[subcode], faculty=[fini])
+        if not known.subject(subcode):
+            raise ValueError(f"Subject with code {subcode} not found")
         
-        # Check if teacher is teaching the same subject at same time in another section
-        same_subject_conflict = self.db.query(SCHEDULE).filter(
-            SCHEDULE.day_id == day_id,
-            SCHEDULE.period_id == period_id,
-            SCHEDULE.fini == fini,
-            SCHEDULE.subcode == subcode,
-            SCHEDULE.section != section
-        ).first()
+        if not known.faculty(fini):
+            raise ValueError(f"Teacher with initials {fini} not found")
         
-        if same_subject_conflict:
-            raise ValueError(f"Teacher {fini} is already teaching {subcode} at day {day_id}, period {period_id} in section {same_subject_conflict.section}. Cannot teach the same subject in multiple sections at the same time.")
+        # Check for section and teacher conflicts
+        self._check_slot_conflicts(day_id, period_id, section, fini)
         
         # Create schedule entry
-        schedule_id = str(uuid.uuid4())[:8]  # Generate short unique ID
+        schedule_id = entry_id or str(uuid.uuid4())[:8]  # Generate short unique ID
         timetable_entry = SCHEDULE(
             id=schedule_id,
             day_id=day_id,
@@ -64,159 +84,90 @@ class ScheduleGenerator:
         )
         
         self.db.add(timetable_entry)
+        log_changes(self.db, [(None, entry_delta(timetable_entry))])
+        record_change(self.db, {"op": "upsert", "entry": entry_delta(timetable_entry)}, [section], [fini])
         self.db.commit()
         self.db.refresh(timetable_entry)
         
         return timetable_entry
     
+    def _load_names(self):
+        """Subject and teacher name maps, from the catalog registry"""
+        known = catalog.get(self.db)
+        return known.subject_names, known.teacher_names
+    
     def get_schedule_by_section(self, section: str) -> List[Dict]:
         """Get schedule for a specific section"""
         schedule = self.db.query(SCHEDULE).filter(
             SCHEDULE.section == section
         ).all()
+        subject_names, teacher_names = self._load_names()
         
-        result = []
-        for entry in schedule:
-            # Handle None values for subcode and fini
-            subcode = entry.subcode if entry.subcode else None
-            fini = entry.fini if entry.fini else None
-            
-            subject = None
-            if subcode:
-                subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
-            
-            teacher = None
-            if fini:
-                teacher = self.db.query(FACULTY).filter(FACULTY.initials == fini).first()
-            
-            result.append({
-                "id": entry.id,
-                "day_id": entry.day_id,
-                "period_id": entry.period_id,
-                "subcode": subcode,
-                "subject_name": subject.name if subject else "Unknown",
-                "section": entry.section,
-                "fini": fini,
-                "teacher_name": teacher.name if teacher else "Unknown"
-            })
-        
-        return result
+        return [format_entry(entry, subject_names, teacher_names) for entry in schedule]
     
     def get_schedule_by_teacher(self, fini: str) -> List[Dict]:
         """Get schedule for a specific teacher"""
         schedule = self.db.query(SCHEDULE).filter(
             SCHEDULE.fini == fini
         ).all()
+        subject_names, _ = self._load_names()
         
-        result = []
-        for entry in schedule:
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == entry.subcode).first()
-            
-            result.append({
-                "id": entry.id,
-                "day_id": entry.day_id,
-                "period_id": entry.period_id,
-                "subcode": entry.subcode,
-                "subject_name": subject.name if subject else "Unknown",
-                "section": entry.section,
-                "fini": entry.fini
-            })
-        
-        return result
+        return [format_entry(entry, subject_names) for entry in schedule]
     
     def get_full_schedule(self) -> List[Dict]:
         """Get complete schedule"""
         schedule = self.db.query(SCHEDULE).all()
+        subject_names, teacher_names = self._load_names()
         
-        result = []
-        for entry in schedule:
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == entry.subcode).first()
-            teacher = self.db.query(FACULTY).filter(FACULTY.initials == entry.fini).first()
-            
-            result.append({
-                "id": entry.id,
-                "day_id": entry.day_id,
-                "period_id": entry.period_id,
-                "subcode": entry.subcode,
-                "subject_name": subject.name if subject else "Unknown",
-                "section": entry.section,
-                "fini": entry.fini,
-                "teacher_name": teacher.name if teacher else "Unknown"
-            })
-        
-        return result
+        return [format_entry(entry, subject_names, teacher_names) for entry in schedule]
     
     def update_schedule_entry(self, entry_id: str, day_id: int = None, period_id: int = None, 
                            subcode: str = None, section: str = None, fini: str = None) -> SCHEDULE:
-        """Update an existing schedule entry"""
+        """Update an existing schedule entry; the conflict check and the update share one transaction"""
         
-        entry = self.db.query(SCHEDULE).filter(SCHEDULE.id == entry_id).first()
+        entry = self.db.get(SCHEDULE, entry_id)
         if not entry:
             raise ValueError(f"Schedule entry with id {entry_id} not found")
         
+        # Verify subject and teacher exist (catalog registry, no queries)
+        known = catalog.get(self.db, subjects=[subcode], faculty=[fini])
+        if subcode is not None and not known.subject(subcode):
+            raise ValueError(f"Subject with code {subcode} not found")
+        if fini is not None and not known.faculty(fini):
+            raise ValueError(f"Teacher with initials {fini} not found")
+        
+        was = entry_delta(entry)
+        
         # Get final values (use existing if not provided)
         final_day_id = day_id if day_id is not None else entry.day_id
         final_period_id = period_id if period_id is not None else entry.period_id
-        final_subcode = subcode if subcode is not None else entry.subcode
         final_section = section if section is not None else entry.section
         final_fini = fini if fini is not None else entry.fini
         
-        # Check for conflicts with other entries (excluding current entry)
-        # Check section conflict
-        section_conflict = self.db.query(SCHEDULE).filter(
-            SCHEDULE.day_id == final_day_id,
-            SCHEDULE.period_id == final_period_id,
-            SCHEDULE.section == final_section,
-            SCHEDULE.id != entry_id
-        ).first()
-        
-        if section_conflict:
-            raise ValueError(f"Schedule conflict: Section {final_section} already has a class at day {final_day_id}, period {final_period_id}")
-        
-        # Check teacher availability (any class at same time)
-        teacher_conflict = self.db.query(SCHEDULE).filter(
-            SCHEDULE.day_id == final_day_id,
-            SCHEDULE.period_id == final_period_id,
-            SCHEDULE.fini == final_fini,
-            SCHEDULE.id != entry_id
-        ).first()
-        
-        if teacher_conflict:
-            raise ValueError(f"Teacher {final_fini} already has a class at day {final_day_id}, period {final_period_id}")
-        
-        # Check if teacher is teaching the same subject at same time in another section
-        same_subject_conflict = self.db.query(SCHEDULE).filter(
-            SCHEDULE.day_id == final_day_id,
-            SCHEDULE.period_id == final_period_id,
-            SCHEDULE.fini == final_fini,
-            SCHEDULE.subcode == final_subcode,
-            SCHEDULE.section != final_section,
-            SCHEDULE.id != entry_id
-        ).first()
-        
-        if same_subject_conflict:
-            raise ValueError(f"Teacher {final_fini} is already teaching {final_subcode} at day {final_day_id}, period {final_period_id} in section {same_subject_conflict.section}. Cannot teach the same subject in multiple sections at the same time.")
-        
-        # Update fields if provided
+        # Write the change first so the check runs inside the write transaction (on SQLite
+        # the flush takes the write lock, so two rapid edits can't both pass the check)
         if day_id is not None:
             entry.day_id = day_id
         if period_id is not None:
             entry.period_id = period_id
         if subcode is not None:
-            # Verify subject exists
-            subject = self.db.query(SUBJECTS).filter(SUBJECTS.code == subcode).first()
-            if not subject:
-                raise ValueError(f"Subject with code {subcode} not found")
             entry.subcode = subcode
         if section is not None:
             entry.section = section
         if fini is not None:
-            # Verify teacher exists
-            teacher = self.db.query(FACULTY).filter(FACULTY.initials == fini).first()
-            if not teacher:
-                raise ValueError(f"Teacher with initials {fini} not found")
             entry.fini = fini
+        self.db.flush()
         
+        # Check for conflicts with other entries (excluding current entry)
+        try:
+            self._check_slot_conflicts(final_day_id, final_period_id, final_section, final_fini, exclude_id=entry_id)
+        except ValueError:
+            self.db.rollback()
+            raise
+        
+        log_changes(self.db, [(was, entry_delta(entry))])
+        record_change(self.db, {"op": "upsert", "entry": entry_delta(entry), "was": was},
+                      [was["section"], final_section], [was["fini"], final_fini])
         self.db.commit()
         self.db.refresh(entry)
         
@@ -230,10 +181,23 @@ class ScheduleGenerator:
             return False
         
         self.db.delete(entry)
+        log_changes(self.db, [(entry_delta(entry), None)])
+        record_change(self.db, {"op": "delete", "id": entry.id, "section": entry.section, "fini": entry.fini},
+                      [entry.section], [entry.fini])
         self.db.commit()
         
         return True
     
+    def clear_section_schedule(self, section: str) -> int:
+        """Delete every entry of a section; returns how many were removed"""
+        removed = [entry_delta(entry) for entry in self.db.query(SCHEDULE).filter(SCHEDULE.section == section)]
+        deleted = self.db.query(SCHEDULE).filter(SCHEDULE.section == section).delete()
+        if deleted:
+            log_changes(self.db, [(row, None) for row in removed])
+            record_change(self.db, {"op": "clear", "section": section}, [section], {row["fini"] for row in removed})
+        self.db.commit()
+        return deleted
+    
     def detect_conflicts(self) -> List[Dict]:
         """Detect conflicts in the schedule"""
         conflicts = []
@@ -272,3 +236,45 @@ class ScheduleGenerator:
                 teacher_dict[key] = {"id": entry.id}
         
         return conflicts
+
+class AsyncScheduleReader:
+    """Read-only timetable queries on an AsyncSession, returning the same shapes as ScheduleGenerator"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _load_names(self):
+        known = await catalog.get_async(self.db)
+        return known.subject_names, known.teacher_names
+
+    async def _entries(self, *criteria, after: Optional[str] = None, limit: Optional[int] = None) -> List[SCHEDULE]:
+        result = await self.db.execute(keyset(select(SCHEDULE).where(*criteria), SCHEDULE.id, after, limit))
+        return list(result.scalars().all())
+
+    async def get_schedule_by_section(self, section: str) -> List[Dict]:
+        schedule = await self._entries(SCHEDULE.section == section)
+        subject_names, teacher_names = await self._load_names()
+        return [format_entry(entry, subject_names, teacher_names) for entry in schedule]
+
+    async def get_schedule_by_teacher(self, fini: str) -> List[Dict]:
+        schedule = await self._entries(SCHEDULE.fini == fini)
+        subject_names, _ = await self._load_names()
+        return [format_entry(entry, subject_names) for entry in schedule]
+
+    async def get_full_schedule(self, after: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        schedule = await self._entries(after=after, limit=limit)
+        subject_names, teacher_names = await self._load_names()
+        return [format_entry(entry, subject_names, teacher_names) for entry in schedule]
+
+    async def iter_full_schedule(self, after: Optional[str] = None, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[Dict]]:
+        """The full schedule in id order, one batch of formatted entries at a time"""
+        while True:
+            batch = await self.get_full_schedule(after, batch_size)
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]["id"]
+
+    async def get_teacher_name(self, fini: str) -> Optional[str]:
+        return (await catalog.get_async(self.db)).teacher_names.get(fini)
@@ -0,0 +1,315 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.orm import Session
+from datetime import datetime
+import json
+import os
+import weakref
+import zlib
+
+from models import SCHEDULE, SCHEDULE_CHANGE, SCHEDULE_SNAPSHOT
+from change_feed import entry_delta, record_change
+from pagination import keyset
+
+# Logged changes between automatic snapshots; restores replay at most this many rows
+SCHEDULE_SNAPSHOT_INTERVAL = int(os.getenv("SCHEDULE_SNAPSHOT_INTERVAL", "500"))
+
+# pg_advisory_xact_lock key that serializes change-log appends on PostgreSQL
+SCHEDULE_HISTORY_LOCK_KEY = 7305001
+
+# Column order of snapshot rows
+SNAPSHOT_FIELDS = ["id", "day_id", "period_id", "subcode", "section", "fini"]
+
+# (row before, row after) of one SCHEDULE entry; None on the missing side for inserts and deletes
+RowChange = Tuple[Optional[Dict], Optional[Dict]]
+
+def _dump(row: Optional[Dict]) -> Optional[str]:
+    return None if row is None else json.dumps(row, separators=(",", ":"))
+
+def _load(value: Optional[str]) -> Optional[Dict]:
+    return None if value is None else json.loads(value)
+
+def current_version(db: Session) -> int:
+    """Id of the latest logged change, 0 before any"""
+    return db.query(func.max(SCHEDULE_CHANGE.id)).scalar() or 0
+
+def _check_version(version: int, latest: int):
+    if version < 0 or version > latest:
+        raise ValueError(f"Version {version} does not exist; the latest is {latest}")
+
+# Engine -> version of its latest snapshot, as this process last saw it. Only a hint:
+# the database is asked again before a snapshot is taken, since other workers take them too.
+_last_snapshot: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _latest_snapshot_version(db: Session) -> Optional[int]:
+    return db.query(func.max(SCHEDULE_SNAPSHOT.version)).scalar()
+
+def _table_state(db: Session) -> Dict[str, Dict]:
+    rows = db.query(*[getattr(SCHEDULE, field) for field in SNAPSHOT_FIELDS]).order_by(SCHEDULE.id).all()
+    return {row[0]: dict(zip(SNAPSHOT_FIELDS, row)) for row in rows}
+
+def _undo(state: Dict[str, Dict], changes: Iterable[RowChange]):
+    """Wind a state back through changes, given newest first"""
+    for before, after in changes:
+        if before is None:
+            state.pop(after["id"], None)
+        else:
+            state[before["id"]] = before
+
+def _store_snapshot(db: Session, version: int, state: Dict[str, Dict]) -> SCHEDULE_SNAPSHOT:
+    snapshot = db.get(SCHEDULE_SNAPSHOT, version)
+    if snapshot is None:
+        snapshot = SCHEDULE_SNAPSHOT(version=version)
+        db.add(snapshot)
+    rows = [[row[field] for field in SNAPSHOT_FIELDS] for _, row in sorted(state.items())]
+    snapshot.created_at = datetime.utcnow()
+    snapshot.entry_count = len(rows)
+    snapshot.data = zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+    return snapshot
+
+def log_changes(db: Session, changes: Iterable[RowChange]):
+    """
+    Append row changes to SCHEDULE_CHANGE on the caller's session, so they
+    commit or roll back with the write they describe. The first batch logged
+    against a database without snapshots also stores the baseline (the table
+    as it was before the batch); after that a snapshot is taken once
+    SCHEDULE_SNAPSHOT_INTERVAL changes have built up since the last one.
+    """
+    changes = [(before, after) for before, after in changes if before != after]
+    if not changes:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        # Versions must commit in id order, or a reader could see version n
+        # before n - 1 exists. SQLite's write lock already gives that; here
+        # appends wait for the previous appender's transaction to end.
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEDULE_HISTORY_LOCK_KEY})
+    now = datetime.utcnow()
+    logged = [
+        SCHEDULE_CHANGE(
+            created_at=now,
+            op="insert" if before is None else "delete" if after is None else "update",
+            entry_id=(after or before)["id"],
+            section=(after or before)["section"],
+            before=_dump(before),
+            after=_dump(after),
+        )
+        for before, after in changes
+    ]
+    db.add_all(logged)
+    # Assigns the new versions, and writes the SCHEDULE rows they describe
+    db.flush()
+    version = logged[-1].id
+
+    bind = db.get_bind()
+    last = _last_snapshot.get(bind)
+    if last is None:
+        last = _latest_snapshot_version(db)
+        if last is None:
+            state = _table_state(db)
+            _undo(state, reversed(changes))
+            _store_snapshot(db, logged[0].id - 1, state)
+            # Not remembered until the next write finds it committed
+            return
+    if version - last >= SCHEDULE_SNAPSHOT_INTERVAL:
+        last = _latest_snapshot_version(db) or 0
+        if version - last >= SCHEDULE_SNAPSHOT_INTERVAL:
+            _store_snapshot(db, version, _table_state(db))
+            _last_snapshot.pop(bind, None)
+            return
+    _last_snapshot[bind] = last
+
+def take_snapshot(db: Session, version: Optional[int] = None) -> SCHEDULE_SNAPSHOT:
+    """Store the whole SCHEDULE table as of `version` (default: the current one); the caller commits"""
+    db.flush()
+    if version is None:
+        version = current_version(db)
+    snapshot = _store_snapshot(db, version, _table_state(db))
+    _last_snapshot.pop(db.get_bind(), None)
+    return snapshot
+
+def ensure_baseline_snapshot(db: Session):
+    """Snapshot the current table if there is none yet, so history starts from what is there"""
+    if db.query(SCHEDULE_SNAPSHOT.version).first() is None:
+        take_snapshot(db)
+        db.commit()
+
+def state_at(db: Session, version: int) -> Dict[str, Dict]:
+    """
+    Every SCHEDULE row as of `version`, keyed by id: the nearest snapshot at
+    or before it plus the changes logged since, or, when that is closer (or
+    there is no such snapshot), the live table with the later changes undone.
+    ValueError for versions that don't exist.
+    """
+    latest = current_version(db)
+    _check_version(version, latest)
+    snapshot = db.query(SCHEDULE_SNAPSHOT).filter(
+        SCHEDULE_SNAPSHOT.version <= version
+    ).order_by(SCHEDULE_SNAPSHOT.version.desc()).first()
+
+    if snapshot is None or latest - version < version - snapshot.version:
+        state = _table_state(db)
+        later = db.query(SCHEDULE_CHANGE.before, SCHEDULE_CHANGE.after).filter(
+            SCHEDULE_CHANGE.id > version, SCHEDULE_CHANGE.id <= latest
+        ).order_by(SCHEDULE_CHANGE.id.desc())
+        _undo(state, ((_load(before), _load(after)) for before, after in later))
+        return state
+
+    state = {row[0]: dict(zip(SNAPSHOT_FIELDS, row)) for row in json.loads(zlib.decompress(snapshot.data))}
+    replay = db.query(SCHEDULE_CHANGE.entry_id, SCHEDULE_CHANGE.after).filter(
+        SCHEDULE_CHANGE.id > snapshot.version, SCHEDULE_CHANGE.id <= version
+    ).order_by(SCHEDULE_CHANGE.id)
+    for entry_id, after in replay:
+        if after is None:
+            state.pop(entry_id, None)
+        else:
+            state[entry_id] = _load(after)
+    return state
+
+def diff(db: Session, from_version: int, to_version: int) -> Dict:
+    """
+    Entries added, removed and changed going from one version to another.
+    Only the changes logged between the two are read, so the cost follows
+    the number of changes, not the size of the timetable. from_version may be
+    the later one, for what going back would change. ValueError for versions
+    that don't exist.
+    """
+    latest = current_version(db)
+    _check_version(from_version, latest)
+    _check_version(to_version, latest)
+    low, high = sorted((from_version, to_version))
+    first_before: Dict[str, Optional[Dict]] = {}
+    last_after: Dict[str, Optional[Dict]] = {}
+    rows = db.query(SCHEDULE_CHANGE.entry_id, SCHEDULE_CHANGE.before, SCHEDULE_CHANGE.after).filter(
+        SCHEDULE_CHANGE.id > low, SCHEDULE_CHANGE.id <= high
+    ).order_by(SCHEDULE_CHANGE.id)
+    for entry_id, before, after in rows:
+        if entry_id not in first_before:
+            first_before[entry_id] = _load(before)
+        last_after[entry_id] = _load(after)
+
+    # Walking backwards swaps which end is the old state
+    old, new = (first_before, last_after) if from_version <= to_version else (last_after, first_before)
+    added, removed, changed = [], [], []
+    for entry_id in sorted(first_before):
+        was, now = old[entry_id], new[entry_id]
+        if was is None and now is not None:
+            added.append(now)
+        elif was is not None and now is None:
+            removed.append(was)
+        elif was != now:
+            changed.append({"before": was, "after": now})
+    return {"from": from_version, "to": to_version, "added": added, "removed": removed, "changed": changed}
+
+def list_changes(db: Session, after: Optional[int] = None, limit: int = 100, section: Optional[str] = None) -> List[Dict]:
+    """Logged changes in version order, a page at a time"""
+    stmt = select(SCHEDULE_CHANGE)
+    if section:
+        stmt = stmt.where(SCHEDULE_CHANGE.section == section)
+    return [
+        {
+            "version": change.id,
+            "created_at": change.created_at,
+            "op": change.op,
+            "entry_id": change.entry_id,
+            "section": change.section,
+            "before": _load(change.before),
+            "after": _load(change.after),
+        }
+        for change in db.execute(keyset(stmt, SCHEDULE_CHANGE.id, after, limit)).scalars()
+    ]
+
+def list_snapshots(db: Session) -> List[Dict]:
+    return [
+        {"version": version, "created_at": created_at, "entry_count": entry_count}
+        for version, created_at, entry_count in db.query(
+            SCHEDULE_SNAPSHOT.version, SCHEDULE_SNAPSHOT.created_at, SCHEDULE_SNAPSHOT.entry_count
+        ).order_by(SCHEDULE_SNAPSHOT.version)
+    ]
+
+def _check_restored_slots(db: Session, written: List[Dict]):
+    """Raise LookupError if a restored row shares its slot with another class of its section or teacher"""
+    if not written:
+        return
+    occupied = db.query(SCHEDULE.id, SCHEDULE.day_id, SCHEDULE.period_id, SCHEDULE.section, SCHEDULE.fini).filter(
+        SCHEDULE.day_id.in_({row["day_id"] for row in written}),
+        SCHEDULE.period_id.in_({row["period_id"] for row in written}),
+    ).all()
+    by_section: Dict[Tuple, List] = {}
+    by_teacher: Dict[Tuple, List] = {}
+    for other in occupied:
+        by_section.setdefault((other.day_id, other.period_id, other.section), []).append(other)
+        by_teacher.setdefault((other.day_id, other.period_id, other.fini), []).append(other)
+    for row in written:
+        slot = (row["day_id"], row["period_id"])
+        if any(other.id != row["id"] for other in by_section.get(slot + (row["section"],), [])):
+            raise LookupError(f"Restore conflict: Section {row['section']} already has a class at day {slot[0]}, period {slot[1]}")
+        for other in by_teacher.get(slot + (row["fini"],), []) if row["fini"] else []:
+            if other.id != row["id"]:
+                raise LookupError(f"Restore conflict: Teacher {row['fini']} already has a class at day {slot[0]}, period {slot[1]} in section {other.section}")
+
+def restore(db: Session, version: int, section: Optional[str] = None) -> Dict:
+    """
+    Put the timetable (or one section of it) back the way it was at `version`.
+    Only rows that differ are written, and they are logged as new changes, so
+    a restore can itself be undone. A section restore also returns rows that
+    have moved into the section since to where they were. Raises ValueError
+    for versions that don't exist and LookupError, writing nothing, if a
+    restored row would clash with a class of its section or teacher. Commits.
+    """
+    past = state_at(db, version)
+    if section:
+        target = {entry_id: row for entry_id, row in past.items() if row["section"] == section}
+        current_rows = db.query(SCHEDULE).filter(
+            or_(SCHEDULE.section == section, SCHEDULE.id.in_(list(target)))
+        ).all()
+        for entry in current_rows:
+            if entry.id not in target and entry.id in past:
+                target[entry.id] = past[entry.id]
+    else:
+        target = past
+        current_rows = db.query(SCHEDULE).all()
+    current = {entry.id: entry for entry in current_rows}
+
+    changes: List[RowChange] = []
+    for entry_id, entry in current.items():
+        if entry_id not in target:
+            changes.append((entry_delta(entry), None))
+            db.delete(entry)
+    # Deletes go first so a restored row can take back a slot another row holds now
+    db.flush()
+    for entry_id, row in target.items():
+        entry = current.get(entry_id)
+        if entry is None:
+            db.add(SCHEDULE(**row))
+            changes.append((None, row))
+        elif entry_delta(entry) != row:
+            changes.append((entry_delta(entry), row))
+            for field in SNAPSHOT_FIELDS[1:]:
+                setattr(entry, field, row[field])
+    db.flush()
+    try:
+        _check_restored_slots(db, [after for before, after in changes if after is not None])
+    except LookupError:
+        db.rollback()
+        raise
+
+    log_changes(db, changes)
+    db.flush()
+    touched = {row["section"] for pair in changes for row in pair if row}
+    finis = {row["fini"] for pair in changes for row in pair if row}
+    if touched:
+        restored = db.query(SCHEDULE).filter(SCHEDULE.section.in_(touched)).all()
+        for name in sorted(touched):
+            record_change(db, {"op": "replace", "section": name,
+                               "entries": [entry_delta(entry) for entry in restored if entry.section == name]},
+                          [name], finis)
+    db.commit()
+
+    return {
+        "restored_to": version,
+        "section": section,
+        "version": current_version(db),
+        "added": sum(1 for before, after in changes if before is None),
+        "removed": sum(1 for before, after in changes if after is None),
+        "changed": sum(1 for before, after in changes if before is not None and after is not None),
+    }
@@ -0,0 +1,188 @@
+from typing import Dict, List
+from sqlalchemy import Integer, String, and_, case, cast, func, or_, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+import models
+
+# Searchable entities and the columns a query matches against
+SEARCH_FIELDS = {
+    "students": (models.STUDENT, ["id", "name", "roll_number"]),
+    "faculty": (models.FACULTY, ["id", "name", "initials", "email"]),
+}
+
+# Trigram indexes can only answer queries of at least three characters; shorter
+# queries are prefix matches served by B-tree indexes on the lowercased columns
+TRIGRAM_MIN_LENGTH = 3
+SEARCH_MAX_LIMIT = 100
+
+# Database URL -> whether the SQLite FTS5 tables exist there
+_fts_available: Dict[str, bool] = {}
+
+def _fts_table(model) -> str:
+    return f"{model.__tablename__}_SEARCH"
+
+def _rowid_column(model) -> str:
+    """
+    Column the FTS rowids mirror: an INTEGER PRIMARY KEY (an alias of rowid,
+    which never changes), else the implicit rowid, which VACUUM may renumber.
+    """
+    primary_key = model.__table__.primary_key.columns
+    if len(primary_key) == 1 and isinstance(list(primary_key)[0].type, Integer):
+        return list(primary_key)[0].name
+    return "rowid"
+
+def _lower_expression(column: str) -> str:
+    """SQL for the expression both the indexes and search() use"""
+    return f'lower(CAST("{column}" AS VARCHAR))'
+
+def _sqlite_fts_ddl(model, columns: List[str]) -> List[str]:
+    """
+    An external-content FTS5 table over the model's table, kept in step by
+    triggers, so every write path (ORM, Core bulk inserts, raw SQL) updates it.
+    Dropped and rebuilt each time, so column changes reach existing databases.
+    """
+    table, fts, key = model.__tablename__, _fts_table(model), _rowid_column(model)
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.{key}, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.{key}, {new});"
+    return [
+        f"DROP TRIGGER IF EXISTS {fts}_ai",
+        f"DROP TRIGGER IF EXISTS {fts}_ad",
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='{key}', tokenize='trigram')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+def _postgres_trigram_ddl(model, columns: List[str]) -> List[str]:
+    """GIN trigram and pattern B-tree indexes on the same expressions the search query filters on"""
+    table = model.__tablename__
+    statements = []
+    for column in columns:
+        statements.append(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_trgm" ON "{table}" '
+                          f'USING gin ({_lower_expression(column)} gin_trgm_ops)')
+        statements.append(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_lower" ON "{table}" '
+                          f'({_lower_expression(column)} varchar_pattern_ops)')
+    return statements
+
+def ensure_search_indexes(engine):
+    """Create the search indexes for the engine's backend; part of init_db"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        with engine.begin() as connection:
+            for model, columns in SEARCH_FIELDS.values():
+                for column in columns:
+                    connection.exec_driver_sql(
+                        f'CREATE INDEX IF NOT EXISTS "ix_{model.__tablename__}_{column}_lower" '
+                        f'ON "{model.__tablename__}" ({_lower_expression(column)})'
+                    )
+        try:
+            with engine.begin() as connection:
+                for model, columns in SEARCH_FIELDS.values():
+                    for statement in _sqlite_fts_ddl(model, columns):
+                        connection.exec_driver_sql(statement)
+        except DBAPIError as e:
+            # Builds without FTS5 or the trigram tokenizer (SQLite < 3.34) search by scanning
+            print(f"Search index unavailable, falling back to LIKE scans: {e}")
+        _fts_available.clear()
+    elif dialect == "postgresql":
+        try:
+            with engine.begin() as connection:
+                connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for model, columns in SEARCH_FIELDS.values():
+                    for statement in _postgres_trigram_ddl(model, columns):
+                        connection.exec_driver_sql(statement)
+        except DBAPIError as e:
+            print(f"Trigram indexes unavailable, falling back to LIKE scans: {e}")
+
+def repair_stale_search_indexes(engine):
+    """
+    Rebuild SQLite FTS tables whose rowids no longer match their table's (a
+    VACUUM can renumber implicit rowids). Run at startup against the primary.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    for model, _ in SEARCH_FIELDS.values():
+        if _rowid_column(model) != "rowid":
+            continue
+        fts = _fts_table(model)
+        with engine.begin() as connection:
+            if connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).first() is None:
+                continue
+            try:
+                connection.exec_driver_sql(f"INSERT INTO {fts}({fts}, rank) VALUES ('integrity-check', 1)")
+            except DBAPIError:
+                print(f"Search index {fts} is out of step with {model.__tablename__}, rebuilding")
+                connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+def search_backend(db: Session) -> str:
+    """'fts5', 'trigram' or 'like', for the database behind this session"""
+    bind = db.get_bind()
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        return "trigram"
+    if dialect == "sqlite":
+        key = str(bind.url)
+        if key not in _fts_available:
+            fts = _fts_table(models.STUDENT)
+            _fts_available[key] = db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}
+            ).first() is not None
+        if _fts_available[key]:
+            return "fts5"
+    return "like"
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _prefix_match(field, needle: str, dialect: str):
+    if dialect == "sqlite":
+        # SQLite only uses the expression index for a range, not for LIKE
+        return and_(field >= needle, field < needle[:-1] + chr(ord(needle[-1]) + 1))
+    return field.like(f"{_escape_like(needle)}%", escape="\\")
+
+def search(db: Session, entity: str, query: str, limit: int = 20, offset: int = 0) -> List:
+    """
+    Rows of `entity` ("students" or "faculty") whose searchable columns contain
+    `query`, case-insensitively (queries shorter than TRIGRAM_MIN_LENGTH
+    match prefixes only). Exact matches on any column rank first, then
+    prefix matches, then other substring matches; ties are ordered by name.
+    """
+    model, columns = SEARCH_FIELDS[entity]
+    needle = query.strip().lower()
+    if not needle:
+        return []
+    fields = [func.lower(cast(getattr(model, column), String)) for column in columns]
+    pattern = _escape_like(needle)
+
+    stmt = select(model)
+    backend = search_backend(db)
+    if len(needle) < TRIGRAM_MIN_LENGTH:
+        stmt = stmt.where(or_(*[_prefix_match(field, needle, db.get_bind().dialect.name) for field in fields]))
+    else:
+        if backend == "fts5":
+            fts = _fts_table(model)
+            phrase = '"' + needle.replace('"', '""') + '"'
+            stmt = stmt.where(text(
+                f"{model.__tablename__}.{_rowid_column(model)} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH :phrase)"
+            ).bindparams(phrase=phrase))
+        # pg_trgm's GIN indexes serve these LIKEs on PostgreSQL and SQLite without FTS5 scans;
+        # with FTS5 they re-check its candidates, so a stale index can't return the wrong rows
+        stmt = stmt.where(or_(*[field.like(f"%{pattern}%", escape="\\") for field in fields]))
+
+    rank = case(
+        (or_(*[field == needle for field in fields]), 0),
+        (or_(*[field.like(f"{pattern}%", escape="\\") for field in fields]), 1),
+        else_=2,
+    )
+    primary_key = model.__mapper__.primary_key[0]
+    stmt = stmt.order_by(rank, model.name, primary_key).offset(offset).limit(min(limit, SEARCH_MAX_LIMIT))
+    return db.execute(stmt).scalars().all()
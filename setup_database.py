@@ -4,8 +4,15 @@ This script creates all tables and populates them with initial data
 """
 
 import models
-from database import SessionLocal, engine
-from sqlalchemy import inspect
+from database import SessionLocal, engine, init_db
+from schedule_history import take_snapshot
+from sqlalchemy import inspect, insert
+from typing import Dict, List, Optional
+import argparse
+import json
+import math
+import random
+import time
 
 def setup_database():
     """
@@ -142,11 +149,290 @@ def setup_schedule(db):
     """Setup SCHEDULE table with data"""
     
     
-    # Clear existing data
+    # Clear existing data, and the history of the old timetable with it
+    db.query(models.SCHEDULE_SNAPSHOT).delete()
+    db.query(models.SCHEDULE_CHANGE).delete()
     db.query(models.SCHEDULE).delete()
+    take_snapshot(db, 0)
     db.commit()
     
     # Insert new data
 
+# ---------------------------------------------------------------------------
+# Synthetic institutions for solver and API benchmarking
+# ---------------------------------------------------------------------------
+
+WORKING_DAYS = [1, 2, 3, 4, 5]
+PERIODS = [1, 2, 3, 5, 6, 7, 8]  # period 4 is the break
+SYNTHETIC_PASSWORD = "password"
+BULK_INSERT_CHUNK = 5000
+
+FIRST_NAMES = ["Aarav", "Ananya", "Arjun", "Diya", "Ishaan", "Kavya", "Rohan", "Saanvi", "Vikram", "Meera",
+               "Aditya", "Priya", "Kabir", "Nisha", "Rahul", "Sneha", "Karan", "Pooja", "Dev", "Riya"]
+LAST_NAMES = ["Sharma", "Banerjee", "Gupta", "Iyer", "Khan", "Mukherjee", "Nair", "Patel", "Reddy", "Sen",
+              "Das", "Ghosh", "Joshi", "Kumar", "Mehta", "Rao", "Roy", "Singh", "Verma", "Chatterjee"]
+DEPARTMENTS = ["CSE", "ECE", "MTH", "PHY", "EEE", "HSM"]
+
+def generate_institution(sections: int = 12, faculty: Optional[int] = None, students: int = 720,
+                         theory_per_section: int = 5, labs_per_section: int = 2,
+                         sections_per_cohort: int = 4, faculty_slack: float = 0.2, seed: int = 42) -> Dict:
+    """
+    Build a synthetic institution as plain row dicts; nothing touches the database.
+
+    Every lab pairs with a theory course, and a faculty member is qualified for a
+    course (subcode1) and usually its lab (subcode2). Sections are grouped into
+    cohorts that share a curriculum, and each (section, subject) is assigned a
+    qualified teacher with the lightest load. The same seed always yields the
+    same institution. Without an explicit faculty count, faculty_slack adds that
+    fraction of spare teachers beyond the minimum needed to cover the demand.
+    """
+    rng = random.Random(seed)
+    cohorts = (sections + sections_per_cohort - 1) // sections_per_cohort
+
+    # Subject catalog: enough distinct courses for every cohort to draw its own curriculum
+    course_count = max(theory_per_section * 2, theory_per_section + cohorts * 2)
+    subjects = []
+    courses = []
+    for i in range(course_count):
+        dept = DEPARTMENTS[i % len(DEPARTMENTS)]
+        code = f"{dept}{2101 + i}"
+        theory = {"code": code, "name": f"{dept} COURSE {i + 1}", "subtype": "T",
+                  "credits": float(rng.choice([3, 3, 4, 4, 4]))}
+        lab = {"code": f"{code}P", "name": f"{dept} COURSE {i + 1} LAB", "subtype": "P",
+               "credits": rng.choice([1.0, 1.5])}
+        subjects.extend([theory, lab])
+        courses.append((theory, lab))
+
+    section_names = [f"{chr(ord('A') + i % 26)}{i // 26 + 1 if i >= 26 else ''}" for i in range(sections)]
+    curricula = {}
+    for c in range(cohorts):
+        picked = rng.sample(courses, theory_per_section)
+        curricula[c] = [course[0] for course in picked] + [course[1] for course in picked[:labs_per_section]]
+
+    # Weekly demand per subject decides how many qualified teachers each needs
+    def periods_needed(subject: Dict) -> int:
+        return int(subject["credits"]) if subject["subtype"] == "T" else int(2 * subject["credits"])
+
+    demand = {}
+    for i in range(sections):
+        for subject in curricula[i // sections_per_cohort]:
+            demand[subject["code"]] = demand.get(subject["code"], 0) + periods_needed(subject)
+
+    max_load = len(WORKING_DAYS) * 5  # at most ~5 teaching periods a day
+    required = sum((load + max_load - 1) // max_load for load in demand.values())
+    if faculty is None:
+        faculty = max(required, 1) + math.ceil(required * faculty_slack)
+    if faculty < required:
+        raise ValueError(f"{faculty} faculty cannot cover {sum(demand.values())} weekly periods; need at least {required}")
+
+    # Qualify the minimum teachers per taught course first, then spread the rest by demand
+    qualifications = []
+    for code, load in sorted(demand.items()):
+        base = code[:-1] if code.endswith("P") else code
+        for _ in range((load + max_load - 1) // max_load):
+            qualifications.append(base)
+    taught = sorted({code[:-1] if code.endswith("P") else code for code in demand})
+    while len(qualifications) < faculty:
+        qualifications.append(rng.choice(taught or [c[0]["code"] for c in courses]))
+    rng.shuffle(qualifications)
+
+    faculty_rows = []
+    for i, course_code in enumerate(qualifications):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        initials = f"{first[0]}{last[0]}{i + 1:03d}"
+        # Most teach their course's lab as well; some take a second theory course instead
+        second = f"{course_code}P" if rng.random() < 0.8 else rng.choice(courses)[0]["code"]
+        faculty_rows.append({
+            "id": i + 1,
+            "password": "",
+            "name": f"{first} {last}",
+            "initials": initials,
+            "email": f"{first.lower()}.{last.lower()}.{i + 1}@faculty.edu",
+            "subcode1": course_code,
+            "subcode2": second,
+            "max_periods_per_day": 6,
+        })
+
+    # Assign each (section, subject) to the least-loaded qualified teacher
+    qualified = {}
+    for row in faculty_rows:
+        for code in (row["subcode1"], row["subcode2"]):
+            qualified.setdefault(code, []).append(row["initials"])
+    load = {row["initials"]: 0 for row in faculty_rows}
+    assignments = {}
+    for i, section in enumerate(section_names):
+        assignments[section] = {}
+        for subject in curricula[i // sections_per_cohort]:
+            code = subject["code"]
+            candidates = qualified.get(code) or qualified[code[:-1] if code.endswith("P") else code]
+            fini = min(candidates, key=lambda initials: (load[initials], initials))
+            load[fini] += periods_needed(subject)
+            assignments[section][code] = fini
+
+    student_rows = []
+    per_section = students // sections if sections else 0
+    extra = students - per_section * sections
+    roll = 1
+    for i, section in enumerate(section_names):
+        for r in range(per_section + (1 if i < extra else 0)):
+            student_rows.append({
+                "id": f"STU{roll:06d}",
+                "password": "",
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "roll_number": roll,
+                "section": section,
+            })
+            roll += 1
+
+    return {
+        "subjects": subjects,
+        "faculty": faculty_rows,
+        "students": student_rows,
+        "sections": section_names,
+        "assignments": assignments,
+    }
+
+def build_synthetic_schedule(institution: Dict, seed: int = 42) -> List[Dict]:
+    """
+    Greedily place every assignment into the week: labs as consecutive blocks
+    that don't span the break, theory one period at a time, with no teacher in
+    two sections at once. Periods that cannot be placed are left out.
+    """
+    rng = random.Random(seed)
+    subjects = {s["code"]: s for s in institution["subjects"]}
+    teacher_busy = set()
+    rows = []
+
+    for section in institution["sections"]:
+        taken = set()
+        assignments = sorted(
+            institution["assignments"][section].items(),
+            key=lambda item: (subjects[item[0]]["subtype"] == "T", item[0])
+        )
+        for code, fini in assignments:
+            subject = subjects[code]
+            if subject["subtype"] == "T":
+                blocks = [1] * int(subject["credits"])
+            else:
+                size = 3 if subject["credits"] == 1.5 else 2
+                blocks = [size] * (int(2 * subject["credits"]) // size)
+
+            for size in blocks:
+                days = WORKING_DAYS[:]
+                rng.shuffle(days)
+                placed = False
+                for day in days:
+                    for start in PERIODS:
+                        run = list(range(start, start + size))
+                        if any(p not in PERIODS for p in run):
+                            continue
+                        if any((day, p) in taken or (day, p, fini) in teacher_busy for p in run):
+                            continue
+                        for p in run:
+                            taken.add((day, p))
+                            teacher_busy.add((day, p, fini))
+                            rows.append({
+                                "id": f"{len(rows):08x}",
+                                "day_id": day,
+                                "period_id": p,
+                                "subcode": code,
+                                "section": section,
+                                "fini": fini,
+                            })
+                        placed = True
+                        break
+                    if placed:
+                        break
+    return rows
+
+def bulk_insert(db, model, rows: List[Dict], chunk_size: int = BULK_INSERT_CHUNK):
+    """Insert rows with executemany in fixed-size chunks"""
+    table = model.__table__
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(table), rows[start:start + chunk_size])
+
+def setup_synthetic_institution(db, sections: int = 12, faculty: Optional[int] = None, students: int = 720,
+                                seed: int = 42, with_schedule: bool = True,
+                                password: str = SYNTHETIC_PASSWORD) -> Dict:
+    """
+    Replace all data with a generated institution and return it (row dicts,
+    sections, and the per-section subject -> faculty assignments).
+
+    Everyone shares one bcrypt hash of `password` so seeding tens of thousands
+    of students doesn't spend minutes hashing.
+    """
+    from auth import get_password_hash
+
+    institution = generate_institution(sections=sections, faculty=faculty, students=students, seed=seed)
+    institution["schedule"] = build_synthetic_schedule(institution, seed) if with_schedule else []
+
+    password_hash = get_password_hash(password)
+    for row in institution["faculty"]:
+        row["password"] = password_hash
+    for row in institution["students"]:
+        row["password"] = password_hash
+
+    # Children before parents so foreign keys hold on PostgreSQL
+    for model in (models.ATTENDANCE_SESSION_ROLLUP, models.ATTENDANCE_STUDENT_ROLLUP, models.ATTENDANCE,
+                  models.SCHEDULE_SNAPSHOT, models.SCHEDULE_CHANGE,
+                  models.SCHEDULE, models.STUDENT, models.FACULTY, models.SUBJECTS):
+        db.query(model).delete()
+
+    bulk_insert(db, models.SUBJECTS, institution["subjects"])
+    bulk_insert(db, models.FACULTY, institution["faculty"])
+    bulk_insert(db, models.STUDENT, institution["students"])
+    bulk_insert(db, models.SCHEDULE, institution["schedule"])
+    take_snapshot(db, 0)  # history starts from the seeded timetable
+    db.commit()
+    return institution
+
+def main():
+    parser = argparse.ArgumentParser(description="Create tables and seed the timetable database")
+    parser.add_argument("--schema-only", action="store_true",
+                        help="Create missing tables and exit without touching data (run once per deploy)")
+    parser.add_argument("--synthetic", action="store_true", help="Seed a generated institution instead of the sample subjects")
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--faculty", type=int, help="Faculty count (default: enough to cover every section plus slack)")
+    parser.add_argument("--students", type=int, default=720)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-schedule", action="store_true", help="Leave SCHEDULE empty, e.g. for solver runs")
+    parser.add_argument("--assignments-out", help="Write the section -> {subcode: faculty initials} map as JSON")
+    args = parser.parse_args()
+
+    if args.schema_only:
+        init_db()
+        print(f"✅ Schema ready: {', '.join(inspect(engine).get_table_names())}")
+        return
+
+    if not args.synthetic:
+        setup_database()
+        return
+
+    init_db()
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        institution = setup_synthetic_institution(
+            db, sections=args.sections, faculty=args.faculty, students=args.students,
+            seed=args.seed, with_schedule=not args.no_schedule
+        )
+        elapsed = time.perf_counter() - start
+    except Exception as e:
+        print(f"❌ Error during synthetic setup: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"✅ Seeded synthetic institution (seed {args.seed}) in {elapsed:.2f}s")
+    for key in ("subjects", "faculty", "students", "schedule"):
+        print(f"   {key.upper():<9} {len(institution[key])} records")
+    print(f"   Students log in with their id, faculty with their email; password '{SYNTHETIC_PASSWORD}'")
+
+    if args.assignments_out:
+        with open(args.assignments_out, "w") as f:
+            json.dump(institution["assignments"], f, indent=2)
+        print(f"📝 Assignments written to {args.assignments_out}")
+
 if __name__ == "__main__":
-    setup_database()
+    main()
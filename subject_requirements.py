@@ -0,0 +1,44 @@
+from typing import Dict
+
+# Lab and practical subjects meet in consecutive blocks
+LAB_SUBTYPES = ("L", "P")
+
+def subject_requirement(subject: Dict) -> Dict:
+    """
+    Weekly scheduling requirement of one subject, the rules both manual
+    validation and the solver follow:
+
+      theory ('T')      credits periods per week, one at a time
+      lab ('L' / 'P')   2 x credits periods per week, in blocks of 3 periods for
+                        1.5 credits, 2 for 1 credit, otherwise `credits` periods
+      anything else     credits periods per week, one at a time
+
+    Raises ValueError when the subject has no credits.
+    """
+    credits = subject["credits"]
+    if not credits:
+        raise ValueError(f"Subject {subject['code']} has no credits defined")
+
+    subtype = (subject["subtype"] or "").upper()
+    is_lab = subtype in LAB_SUBTYPES
+    if is_lab:
+        periods_needed = int(2 * credits)
+        if credits == 1.5:
+            block_length = 3
+        elif credits == 1.0:
+            block_length = 2
+        else:
+            block_length = int(credits)
+    else:
+        periods_needed = int(credits)
+        block_length = 1
+
+    return {
+        "name": subject["name"],
+        "credits": credits,
+        "subtype": subject["subtype"],
+        "periods_needed": periods_needed,
+        "is_lab": is_lab,
+        "consecutive_periods": block_length,
+        "blocks": periods_needed // block_length if block_length else 0,
+    }
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db")
+
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="module")
+def client():
+    """Admin client on a freshly seeded small institution"""
+    import main
+    from database import SessionLocal, init_db
+    from setup_database import setup_synthetic_institution
+
+    init_db()
+    db = SessionLocal()
+    try:
+        setup_synthetic_institution(db, sections=2, students=20, seed=1)
+    finally:
+        db.close()
+    with TestClient(main.app) as test_client:
+        token = test_client.post(
+            "/auth/login", json={"username": "admin", "password": "admin", "user_type": "admin"}
+        ).json()["access_token"]
+        test_client.headers["Authorization"] = f"Bearer {token}"
+        yield test_client
@@ -0,0 +1,50 @@
+"""Offline sync must treat naive and offset timestamps alike, the way a live check-in does."""
+
+from datetime import datetime, timezone
+
+from database import SessionLocal
+from models import ATTENDANCE, SCHEDULE, STUDENT
+
+def _student_and_class():
+    db = SessionLocal()
+    try:
+        student = db.query(STUDENT.id, STUDENT.section).order_by(STUDENT.id).first()
+        entry = db.query(SCHEDULE.id).filter(SCHEDULE.section == student.section).order_by(SCHEDULE.id).first()
+        return student.id, entry.id
+    finally:
+        db.close()
+
+def test_sync_accepts_mixed_naive_and_aware_timestamps(client):
+    student_id, schedule_id = _student_and_class()
+    response = client.post("/attendance/sync", json={"records": [
+        {"student_id": student_id, "schedule_id": schedule_id, "timestamp": "2026-10-12T10:00:00"},
+        {"student_id": student_id, "schedule_id": schedule_id, "timestamp": "2026-10-13T10:00:00Z"},
+    ]})
+    assert response.status_code == 200, response.text
+    assert [result["status"] for result in response.json()["results"]] == ["inserted", "inserted"]
+
+    aware = datetime(2026, 10, 13, 10, tzinfo=timezone.utc)
+    db = SessionLocal()
+    try:
+        rows = db.query(ATTENDANCE.timestamp, ATTENDANCE.session_date).filter(
+            ATTENDANCE.student_id == student_id, ATTENDANCE.schedule_id == schedule_id
+        ).order_by(ATTENDANCE.timestamp).all()
+    finally:
+        db.close()
+    # Stored as naive UTC, dated by the local day
+    assert rows[-1].timestamp == aware.replace(tzinfo=None)
+    assert rows[-1].session_date == aware.astimezone().date()
+    assert rows[0].timestamp == datetime(2026, 10, 12, 10).astimezone(timezone.utc).replace(tzinfo=None)
+
+def test_sync_deduplicates_one_scan_in_either_form(client):
+    student_id, schedule_id = _student_and_class()
+    # Near midnight, so the UTC date differs from the local one wherever the zone has an offset
+    east = datetime(2026, 10, 14, 12).astimezone().utcoffset().total_seconds() > 0
+    local = datetime(2026, 10, 14, 0, 30) if east else datetime(2026, 10, 14, 23, 30)
+    response = client.post("/attendance/sync", json={"records": [
+        {"student_id": student_id, "schedule_id": schedule_id, "timestamp": local.isoformat()},
+        {"student_id": student_id, "schedule_id": schedule_id,
+         "timestamp": local.astimezone().astimezone(timezone.utc).isoformat()},
+    ]})
+    assert response.status_code == 200, response.text
+    assert [result["status"] for result in response.json()["results"]] == ["inserted", "duplicate"]
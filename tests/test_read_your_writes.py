@@ -0,0 +1,34 @@
+"""Write endpoints that bypass the ORM flush must still mark the client as having written."""
+
+import main
+from database import LAST_WRITE_COOKIE, LAST_WRITE_HEADER, reads_pinned_to_primary
+
+def assert_marked_write(response):
+    assert response.status_code == 200, response.text
+    assert response.headers[LAST_WRITE_HEADER].isdigit()
+    assert LAST_WRITE_COOKIE in response.headers.get("set-cookie", "")
+
+def test_bulk_section_delete_marks_write(client):
+    assert_marked_write(client.delete("/schedule/section/A"))
+
+def test_rollup_rebuild_marks_write(client):
+    assert_marked_write(client.post("/attendance/rollups/rebuild"))
+
+def test_reads_do_not_mark_write(client):
+    response = client.get("/subjects/")
+    assert response.status_code == 200
+    assert LAST_WRITE_HEADER not in response.headers
+
+def test_echoed_header_pins_reads(client):
+    written_at = client.delete("/schedule/section/B").headers[LAST_WRITE_HEADER]
+    pinned = []
+
+    @main.app.get("/_test/pinned")
+    def pinned_route():
+        pinned.append(reads_pinned_to_primary())
+        return {}
+
+    client.cookies.clear()
+    client.get("/_test/pinned")
+    client.get("/_test/pinned", headers={LAST_WRITE_HEADER: written_at})
+    assert pinned == [False, True]